@@ -1,7 +1,9 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
-from database import init_db_pool, close_db_pool
+from json_provider import FastJSONProvider
+from database import init_db_pool, close_db_pool, pool_stats, release_request_connection
+from bus import start_bus
 import logging
 
 # Configurar logging
@@ -15,12 +17,16 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Serialización JSON con orjson (si está instalado)
+app.json = FastJSONProvider(app)
+
 # Configurar CORS
 CORS(app, resources={
     r"/api/*": {
         "origins": Config.CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
@@ -30,6 +36,10 @@ from routes.categorias import categorias_bp
 from routes.movimientos import movimientos_bp
 from routes.presupuestos import presupuestos_bp
 from routes.metas import metas_bp
+from routes.dashboard import dashboard_bp
+from routes.batch import batch_bp
+from routes.sync import sync_bp
+from routes.eventos import eventos_bp
 
 # Registrar blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -37,6 +47,14 @@ app.register_blueprint(categorias_bp, url_prefix='/api/categorias')
 app.register_blueprint(movimientos_bp, url_prefix='/api/movimientos')
 app.register_blueprint(presupuestos_bp, url_prefix='/api/presupuestos')
 app.register_blueprint(metas_bp, url_prefix='/api/metas')
+app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+app.register_blueprint(batch_bp, url_prefix='/api/batch')
+app.register_blueprint(sync_bp, url_prefix='/api/sync')
+app.register_blueprint(eventos_bp, url_prefix='/api/eventos')
+
+# Registrar comandos de mantenimiento (flask --app app <comando>)
+from commands import register_commands
+register_commands(app)
 
 # Ruta de prueba
 @app.route('/')
@@ -49,7 +67,11 @@ def index():
             'categorias': '/api/categorias',
             'movimientos': '/api/movimientos',
             'presupuestos': '/api/presupuestos',
-            'metas': '/api/metas'
+            'metas': '/api/metas',
+            'dashboard': '/api/dashboard',
+            'batch': '/api/batch',
+            'sync': '/api/sync',
+            'eventos': '/api/eventos'
         }
     })
 
@@ -58,6 +80,11 @@ def index():
 def health():
     return jsonify({'status': 'ok'}), 200
 
+# Estadísticas del pool de conexiones
+@app.route('/health/pool')
+def health_pool():
+    return jsonify(pool_stats() or {}), 200
+
 # Manejador de errores 404
 @app.errorhandler(404)
 def not_found(error):
@@ -75,12 +102,18 @@ def before_first_request():
     if not hasattr(app, 'db_initialized'):
         try:
             init_db_pool()
+            start_bus()
             app.db_initialized = True
             logger.info('Aplicación iniciada correctamente')
         except Exception as e:
             logger.error(f'Error al inicializar la aplicación: {e}')
             raise
 
+# Devolver la conexión del request si quedó abierta
+@app.teardown_request
+def teardown_db_connection(exception=None):
+    release_request_connection(exception)
+
 # Cerrar pool de conexiones al cerrar la aplicación
 @app.teardown_appcontext
 def shutdown_session(exception=None):
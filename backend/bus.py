@@ -0,0 +1,124 @@
+import json
+import logging
+import select
+import threading
+import psycopg2
+from psycopg2 import extensions
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Canal en el que los triggers de versiones_datos avisan de cada escritura
+CANAL_CAMBIOS = 'cambios_datos'
+
+
+class DataChangeBus:
+    """Escucha los avisos de cambios de PostgreSQL en un hilo propio
+
+    Cada proceso abre una conexión dedicada (fuera del pool) con
+    `LISTEN cambios_datos` y reenvía cada aviso a los suscriptores como
+    `callback(usuario_id, recurso)`. Al (re)conectarse se pudieron perder
+    avisos, así que se notifica `callback(None, None)`: los suscriptores
+    deben descartar todo lo que tengan en caché.
+
+    La entrega es como máximo una vez y llega después del commit que la
+    generó: sirve para descartar antes de tiempo o avisar a los clientes,
+    no para decidir si un dato en caché sigue vigente. Eso se comprueba
+    con versiones_datos (ver cache.py).
+    """
+
+    def __init__(self, dsn, canal=CANAL_CAMBIOS, poll_timeout=5.0,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.dsn = dsn
+        self.canal = canal
+        self.poll_timeout = poll_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self):
+        """Inicia el hilo de escucha (una vez por proceso)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='data-change-bus', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, usuario_id, recurso):
+        """Entrega un aviso a los suscriptores de este proceso"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(usuario_id, recurso)
+            except Exception as e:
+                logger.error(f"Error al procesar aviso de cambio: {e}")
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.canal}")
+                logger.info(f"Escuchando avisos de cambios en '{self.canal}'")
+                delay = self.reconnect_delay
+                self.publish(None, None)
+                self._listen(conn)
+            except psycopg2.Error as e:
+                logger.warning(f"Conexión de avisos de cambios perdida: {e}")
+            except Exception:
+                # Cualquier otro error también se reintenta: si el hilo
+                # muriera, las cachés y los eventos dejarían de actualizarse
+                logger.exception("Error inesperado escuchando avisos de cambios")
+            finally:
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                aviso = conn.notifies.pop(0)
+                try:
+                    data = json.loads(aviso.payload)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    logger.warning(f"Aviso de cambio inválido: {aviso.payload!r}")
+                    continue
+                self.publish(data.get('usuarioId'), data.get('recurso'))
+
+
+bus = DataChangeBus(Config.get_db_connection_string())
+
+
+def start_bus():
+    """Inicia la escucha de cambios si está habilitada en la configuración"""
+    if Config.DB_LISTEN_ENABLED:
+        bus.start()
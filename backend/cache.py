@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_request_context
+from config import Config
+from database import Database
+from bus import bus
+
+
+class TTLCache:
+    """Caché LRU en memoria, segura entre hilos, con expiración por entrada
+
+    Cada proceso tiene su propia copia. Los avisos de cambios (bus.py)
+    solo adelantan el descarte en los demás procesos; la vigencia de cada
+    entrada se decide con la versión con la que se leyó, y `ttl` acota la
+    memoria ocupada por entradas que ya nadie consulta.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # llave -> (valor, momento en que expira)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Retorna el valor guardado o None si no existe o ya expiró"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Categorías de cada usuario: usuarioId -> (lista ordenada, {id: categoría},
+# versión de 'categorias' en versiones_datos con la que se leyeron)
+categorias_cache = TTLCache(
+    maxsize=Config.CATEGORIAS_CACHE_MAX,
+    ttl=Config.CATEGORIAS_CACHE_TTL
+)
+
+
+def _cargar_categorias(usuario_id):
+    # Categorías y versión en una sola sentencia: ambas salen de la misma
+    # instantánea, así la versión nunca es más nueva que las filas
+    with Database() as db:
+        rows = db.execute(
+            """
+            SELECT COALESCE(v.version, 0) AS version,
+                   c.id, c.nombre, c.tipo, c.descripcion, c.fecha
+            FROM (SELECT 1) AS uno
+            LEFT JOIN versiones_datos v
+                   ON v.usuarioId = %s AND v.recurso = 'categorias'
+            LEFT JOIN categorias c ON c.usuarioId = %s
+            ORDER BY c.tipo, c.nombre
+            """,
+            (usuario_id, usuario_id)
+        )
+    version = rows[0]['version']
+    lista = [
+        {k: row[k] for k in ('id', 'nombre', 'tipo', 'descripcion', 'fecha')}
+        for row in rows if row['id'] is not None
+    ]
+    entrada = (lista, {cat['id']: cat for cat in lista}, version)
+    # Dentro de un lote (Database.shared_with_subrequests) la consulta ve
+    # escrituras aún sin confirmar que podrían deshacerse: no se guardan
+    if not (has_request_context() and g.get('_db_hold')):
+        categorias_cache.set(usuario_id, entrada)
+    return entrada
+
+
+def _entrada_vigente(usuario_id, version_minima=None):
+    """Entrada en caché, o None si no existe o es anterior a `version_minima`"""
+    entrada = categorias_cache.get(usuario_id)
+    if entrada is None or (version_minima is not None and entrada[2] < version_minima):
+        return None
+    return entrada
+
+
+def get_categorias_usuario(usuario_id, tipo=None, version_minima=None):
+    """Categorías del usuario ordenadas por tipo y nombre (desde la caché)
+
+    `version_minima` es la versión de 'categorias' que el llamador ya leyó
+    (p. ej. para el ETag, ver conditional.version_leida): una entrada más
+    antigua se recarga aunque el aviso de cambio (bus.py) aún no llegue.
+    Las filas se comparten entre requests: no deben modificarse.
+    """
+    entrada = _entrada_vigente(usuario_id, version_minima) or _cargar_categorias(usuario_id)
+    lista = entrada[0]
+    if tipo:
+        return [cat for cat in lista if cat['tipo'] == tipo]
+    return lista
+
+
+def buscar_categorias(usuario_id, categoria_ids):
+    """Retorna {id: categoría} con las categorías del usuario encontradas
+
+    Si alguna no está en la caché se recarga una vez, por si se creó desde
+    otro proceso. La escritura debe seguir verificando las categorías en la
+    base de datos, ya que pudieron eliminarse después de cargarlas.
+    """
+    entrada = categorias_cache.get(usuario_id)
+    if entrada is None or any(cid not in entrada[1] for cid in categoria_ids):
+        entrada = _cargar_categorias(usuario_id)
+    return {cid: entrada[1][cid] for cid in categoria_ids if cid in entrada[1]}
+
+
+def get_categoria_usuario(usuario_id, categoria_id):
+    """Busca una categoría del usuario; None si no existe o no le pertenece"""
+    try:
+        categoria_id = int(categoria_id)
+    except (TypeError, ValueError):
+        return None
+    return buscar_categorias(usuario_id, [categoria_id]).get(categoria_id)
+
+
+def invalidar_categorias(usuario_id):
+    """Descarta las categorías en caché de un usuario"""
+    categorias_cache.pop(usuario_id)
+
+
+def _on_cambio(usuario_id, recurso):
+    """Descarta antes de tiempo lo que otro proceso modificó
+
+    Es solo una optimización: los avisos pueden perderse o llegar después
+    del commit. Lo que garantiza que no se sirvan datos viejos bajo un
+    ETag nuevo es la versión guardada en cada entrada.
+    """
+    if usuario_id is None:
+        categorias_cache.clear()
+    elif recurso == 'categorias':
+        categorias_cache.pop(usuario_id)
+
+
+bus.subscribe(_on_cambio)
@@ -0,0 +1,240 @@
+from functools import wraps
+import click
+from database import Database, init_db_pool, close_db_pool
+import migrations
+
+
+def _with_db_pool(f):
+    """Inicializa el pool de conexiones alrededor de un comando de consola"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        init_db_pool()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            close_db_pool()
+    return wrapper
+
+
+@click.group('balance')
+def balance_cli():
+    """Mantenimiento de la tabla balance_usuarios"""
+
+
+@balance_cli.command('recalcular')
+@_with_db_pool
+def balance_recalcular():
+    """Reconstruye los totales de todos los usuarios desde cero"""
+    with Database() as db:
+        result = db.execute_one("SELECT recalcular_balance_usuarios() AS filas")
+    click.echo(f"Balance recalculado para {result['filas']} usuarios")
+
+
+@balance_cli.command('verificar')
+@_with_db_pool
+def balance_verificar():
+    """Compara los totales acumulados con los recalculados"""
+    with Database() as db:
+        diferencias = db.execute(
+            """
+            SELECT r.usuarioId AS usuario_id,
+                   COALESCE(b.total_ingresos, 0) AS ingresos_acumulados,
+                   r.total_ingresos AS ingresos_reales,
+                   COALESCE(b.total_gastos, 0) AS gastos_acumulados,
+                   r.total_gastos AS gastos_reales
+            FROM vista_balance_recalculado r
+            LEFT JOIN balance_usuarios b ON b.usuarioId = r.usuarioId
+            WHERE COALESCE(b.total_ingresos, 0) <> r.total_ingresos
+               OR COALESCE(b.total_gastos, 0) <> r.total_gastos
+               OR COALESCE(b.num_ingresos, 0) <> r.num_ingresos
+               OR COALESCE(b.num_gastos, 0) <> r.num_gastos
+            ORDER BY r.usuarioId
+            """
+        )
+
+    if not diferencias:
+        click.echo("Balance correcto para todos los usuarios")
+        return
+
+    for d in diferencias:
+        click.echo(
+            f"Usuario {d['usuario_id']}: ingresos {d['ingresos_acumulados']} "
+            f"(real {d['ingresos_reales']}), gastos {d['gastos_acumulados']} "
+            f"(real {d['gastos_reales']})"
+        )
+    raise click.ClickException(
+        f"{len(diferencias)} usuarios con diferencias; ejecute 'flask balance recalcular'"
+    )
+
+
+@click.group('presupuestos')
+def presupuestos_cli():
+    """Mantenimiento de las cubetas diarias de gasto (gastos_diarios)"""
+
+
+@presupuestos_cli.command('recalcular')
+@_with_db_pool
+def presupuestos_recalcular():
+    """Reconstruye las cubetas diarias desde la tabla de gastos"""
+    with Database() as db:
+        result = db.execute_one("SELECT recalcular_gastos_diarios() AS filas")
+    click.echo(f"Cubetas diarias recalculadas: {result['filas']}")
+
+
+@presupuestos_cli.command('verificar')
+@_with_db_pool
+def presupuestos_verificar():
+    """Compara las cubetas diarias con las recalculadas"""
+    with Database() as db:
+        result = db.execute_one(
+            """
+            SELECT COUNT(*) AS diferencias
+            FROM gastos_diarios d
+            FULL JOIN vista_gastos_diarios_recalculado r
+                ON r.usuarioId = d.usuarioId
+               AND r.categoriaId = d.categoriaId
+               AND r.dia = d.dia
+            WHERE COALESCE(d.total, 0) <> COALESCE(r.total, 0)
+               OR COALESCE(d.num, 0) <> COALESCE(r.num, 0)
+            """
+        )
+
+    if result['diferencias'] == 0:
+        click.echo("Cubetas diarias correctas")
+        return
+
+    raise click.ClickException(
+        f"{result['diferencias']} cubetas con diferencias; "
+        "ejecute 'flask presupuestos recalcular'"
+    )
+
+
+@click.group('analitica')
+def analitica_cli():
+    """Mantenimiento de las cubetas diarias de movimientos (movimientos_diarios)"""
+
+
+@analitica_cli.command('recalcular')
+@_with_db_pool
+def analitica_recalcular():
+    """Reconstruye las cubetas diarias desde gastos e ingresos (backfill)"""
+    with Database() as db:
+        result = db.execute_one("SELECT recalcular_movimientos_diarios() AS filas")
+    click.echo(f"Cubetas de movimientos recalculadas: {result['filas']}")
+
+
+@analitica_cli.command('verificar')
+@_with_db_pool
+def analitica_verificar():
+    """Compara las cubetas diarias con las recalculadas"""
+    with Database() as db:
+        result = db.execute_one(
+            """
+            SELECT COUNT(*) AS diferencias
+            FROM movimientos_diarios d
+            FULL JOIN vista_movimientos_diarios_recalculado r
+                ON r.usuarioId = d.usuarioId
+               AND r.dia = d.dia
+               AND r.tipo = d.tipo
+               AND r.categoriaId = d.categoriaId
+               AND r.metodo_pago = d.metodo_pago
+            WHERE COALESCE(d.total, 0) <> COALESCE(r.total, 0)
+               OR COALESCE(d.num, 0) <> COALESCE(r.num, 0)
+            """
+        )
+
+    if result['diferencias'] == 0:
+        click.echo("Cubetas de movimientos correctas")
+        return
+
+    raise click.ClickException(
+        f"{result['diferencias']} cubetas con diferencias; "
+        "ejecute 'flask analitica recalcular'"
+    )
+
+
+@click.group('db')
+def db_cli():
+    """Migraciones del esquema de la base de datos"""
+
+
+@db_cli.command('migrar')
+@_with_db_pool
+def db_migrar():
+    """Aplica las migraciones pendientes (ejecutar en cada despliegue)"""
+    aplicadas = migrations.migrate(log=click.echo)
+    if aplicadas:
+        click.echo(f"Migraciones aplicadas: {', '.join(aplicadas)}")
+    else:
+        click.echo("El esquema ya está actualizado")
+
+
+@db_cli.command('estado')
+@_with_db_pool
+def db_estado():
+    """Muestra qué migraciones están aplicadas"""
+    for version, nombre, aplicada in migrations.status():
+        marca = 'aplicada ' if aplicada else 'pendiente'
+        click.echo(f"[{marca}] {version}_{nombre}")
+
+
+@db_cli.command('verificar-indices')
+@_with_db_pool
+def db_verificar_indices():
+    """Comprueba con EXPLAIN que las consultas frecuentes usan índices"""
+    fallas = 0
+    for nombre, seq_scans in migrations.check_indexes():
+        if seq_scans:
+            fallas += 1
+            click.echo(f"[FALLA] {nombre}: Seq Scan en {', '.join(seq_scans)}")
+        else:
+            click.echo(f"[ok]    {nombre}")
+
+    if fallas:
+        raise click.ClickException(f"{fallas} consultas sin índice; ejecute 'flask db migrar'")
+
+
+@db_cli.command('particiones')
+@click.option('--meses', default=3, show_default=True,
+              help='Meses hacia adelante que deben tener partición')
+@_with_db_pool
+def db_particiones(meses):
+    """Crea por adelantado las particiones mensuales de gastos e ingresos
+
+    Programar periódicamente (p. ej. cron diario) para que las fechas
+    nuevas nunca caigan en la partición por defecto.
+    """
+    with Database() as db:
+        result = db.execute_one(
+            """
+            SELECT crear_particiones_movimientos(
+                CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::DATE
+            ) AS creadas
+            """,
+            (meses,)
+        )
+    click.echo(f"Particiones creadas: {result['creadas']}")
+
+
+@db_cli.command('purgar-sync')
+@click.option('--dias', default=90, show_default=True, type=click.IntRange(min=1),
+              help='Antigüedad mínima de las lápidas a eliminar')
+@_with_db_pool
+def db_purgar_sync(dias):
+    """Elimina de cambios_sync las lápidas de registros eliminados hace tiempo
+
+    Los clientes con un token anterior a la purga reciben 410 en /api/sync
+    y sincronizan desde cero; `--dias` debe superar el tiempo que un
+    cliente suele pasar sin sincronizar. Programar periódicamente (cron).
+    """
+    with Database() as db:
+        result = db.execute_one("SELECT purgar_lapidas_sync(%s) AS purgadas", (dias,))
+    click.echo(f"Lápidas purgadas: {result['purgadas']}")
+
+
+def register_commands(app):
+    """Registra los comandos de mantenimiento en `flask`"""
+    app.cli.add_command(balance_cli)
+    app.cli.add_command(presupuestos_cli)
+    app.cli.add_command(analitica_cli)
+    app.cli.add_command(db_cli)
@@ -0,0 +1,74 @@
+import hashlib
+import time
+from functools import wraps
+from flask import request, jsonify, make_response, g, has_request_context
+from database import Database
+
+# Recursos con contador de versión (tabla versiones_datos)
+RECURSOS = ('categorias', 'gastos', 'ingresos', 'presupuestos', 'metas')
+
+
+def data_versions(usuario_id, recursos):
+    """Versiones actuales de `recursos` para un usuario (0 si nunca cambió)"""
+    with Database() as db:
+        rows = db.execute(
+            """
+            SELECT recurso, version FROM versiones_datos
+            WHERE usuarioId = %s AND recurso = ANY(%s)
+            """,
+            (usuario_id, list(recursos))
+        )
+    versiones = {row['recurso']: row['version'] for row in rows}
+    return [versiones.get(recurso, 0) for recurso in recursos]
+
+
+def version_leida(recurso):
+    """Versión de `recurso` usada para el ETag del request actual (o None)"""
+    if not has_request_context():
+        return None
+    return g.get('versiones_datos', {}).get(recurso)
+
+
+def conditional_get(*recursos, por_dia=False):
+    """Decorador para GET con ETag derivado de las versiones de datos
+
+    El ETag combina usuario, ruta con parámetros y la versión de cada
+    recurso del que depende la respuesta. Si coincide con If-None-Match se
+    responde 304 sin ejecutar la consulta principal ni serializar JSON.
+    Con `por_dia` el ETag cambia también con el día (UTC), para respuestas
+    que dependen de la fecha actual. Se aplica debajo de @token_required.
+    """
+    for recurso in recursos:
+        if recurso not in RECURSOS:
+            raise ValueError(f"Recurso sin versión: {recurso}")
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            try:
+                versiones = data_versions(current_user['user_id'], recursos)
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+            # La respuesta no debe salir de datos anteriores a estas versiones
+            g.versiones_datos = dict(zip(recursos, versiones))
+
+            partes = [str(current_user['user_id']), request.full_path]
+            partes.extend(str(v) for v in versiones)
+            if por_dia:
+                partes.append(str(int(time.time()) // 86400))
+            etag = hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            # Débil: el cuerpo equivale, no necesariamente idéntico byte a byte
+            response.set_etag(etag, weak=True)
+            # El navegador siempre revalida con If-None-Match antes de reutilizarla
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
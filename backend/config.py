@@ -18,6 +18,30 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '221122')
     
+    # Configuración del pool de conexiones (tiempos en segundos)
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '20'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+    DB_POOL_CHECK_IDLE_AFTER = float(os.getenv('DB_POOL_CHECK_IDLE_AFTER', '30'))
+    
+    # Caché en memoria de categorías por usuario (segundos / usuarios)
+    CATEGORIAS_CACHE_TTL = float(os.getenv('CATEGORIAS_CACHE_TTL', '300'))
+    CATEGORIAS_CACHE_MAX = int(os.getenv('CATEGORIAS_CACHE_MAX', '10000'))
+    
+    # Escuchar avisos de cambios (LISTEN/NOTIFY) para invalidar cachés
+    DB_LISTEN_ENABLED = os.getenv('DB_LISTEN_ENABLED', 'True') == 'True'
+    
+    # Consultas paralelas del dashboard: hilos del proceso y máximo por request
+    DASHBOARD_WORKERS = int(os.getenv('DASHBOARD_WORKERS', '8'))
+    DASHBOARD_MAX_CONCURRENCIA = int(os.getenv('DASHBOARD_MAX_CONCURRENCIA', '3'))
+    
+    # Server-Sent Events: segundos entre comentarios de keep-alive, máximo
+    # de clientes conectados por proceso y vigencia del ticket de conexión
+    SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+    SSE_MAX_CLIENTES = int(os.getenv('SSE_MAX_CLIENTES', '500'))
+    SSE_TICKET_SEGUNDOS = int(os.getenv('SSE_TICKET_SEGUNDOS', '60'))
+    
     # Configuración de JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ALGORITHM = 'HS256'
@@ -1,8 +1,14 @@
 import psycopg2
-from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import adapt, register_adapter
+from psycopg2.extras import RealDictCursor, CompositeCaster, execute_values, register_composite
+from flask import g, has_request_context
 from config import Config
+from db_pool import ConnectionPool
+from contextlib import contextmanager
 import logging
+import queue
+import threading
+import uuid
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -15,17 +21,28 @@ def init_db_pool():
     """Inicializa el pool de conexiones a la base de datos"""
     global connection_pool
     try:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 20,  # min y max conexiones
-            Config.get_db_connection_string()
+        connection_pool = ConnectionPool(
+            Config.get_db_connection_string(),
+            minconn=Config.DB_POOL_MIN,
+            maxconn=Config.DB_POOL_MAX,
+            timeout=Config.DB_POOL_TIMEOUT,
+            max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+            check_idle_after=Config.DB_POOL_CHECK_IDLE_AFTER
         )
         logger.info("Pool de conexiones a la base de datos inicializado correctamente")
+        
+        # Registrar el tipo compuesto monto para todas las conexiones
+        conn = connection_pool.getconn()
+        try:
+            register_composite('monto', conn, globally=True, factory=_MontoCaster)
+        finally:
+            connection_pool.putconn(conn)
     except Exception as e:
         logger.error(f"Error al inicializar el pool de conexiones: {e}")
         raise
 
 def get_db_connection():
-    """Obtiene una conexión del pool"""
+    """Obtiene una conexión del pool (espera si todas están ocupadas)"""
     if connection_pool:
         return connection_pool.getconn()
     else:
@@ -42,34 +59,176 @@ def close_db_pool():
         connection_pool.closeall()
         logger.info("Pool de conexiones cerrado")
 
+def pool_stats():
+    """Retorna las estadísticas del pool de conexiones"""
+    if connection_pool:
+        return connection_pool.stats()
+    return None
+
+def _acquire_request_connection():
+    """Obtiene la conexión del request actual (del pool en el primer uso)"""
+    if g.get('_db_conn') is None:
+        g._db_conn = get_db_connection()
+        g._db_depth = 0
+        g._db_failed = False
+        g._db_after_commit = []
+    g._db_depth += 1
+    return g._db_conn
+
+def _release_request_connection(failed):
+    """Cierra un nivel de uso; el más externo termina la transacción"""
+    g._db_failed = g._db_failed or failed
+    g._db_depth -= 1
+    if g._db_depth > 0:
+        return
+    
+    conn = g.pop('_db_conn')
+    callbacks = g.pop('_db_after_commit', [])
+    try:
+        if g._db_failed:
+            conn.rollback()
+            return
+        conn.commit()
+    finally:
+        return_db_connection(conn)
+    _run_after_commit(callbacks)
+
+def _run_after_commit(callbacks):
+    """Ejecuta las funciones registradas con `Database.after_commit`"""
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error después del commit: {e}")
+
+def release_request_connection(exception=None):
+    """Devuelve la conexión del request si quedó abierta (teardown)"""
+    if g.get('_db_hold'):
+        # Teardown de un sub-request (Database.shared_with_subrequests): la
+        # conexión sigue en uso por el request que lo despachó
+        return
+    conn = g.pop('_db_conn', None)
+    g.pop('_db_after_commit', None)
+    if conn is not None:
+        logger.warning("Conexión del request liberada en teardown, se hace rollback")
+        try:
+            conn.rollback()
+        finally:
+            return_db_connection(conn)
+
 class Database:
-    """Clase para manejar operaciones de base de datos"""
+    """Clase para manejar operaciones de base de datos
+
+    Dentro de un request, los `with Database()` anidados comparten una
+    sola conexión (guardada en `flask.g`). El bloque más externo hace
+    commit, o rollback si algún bloque terminó con error, y devuelve la
+    conexión al pool de inmediato.
+    """
     
     def __init__(self):
         self.conn = None
         self.cursor = None
+        self.scoped = False
+        self._after_commit = []
+        self._failed = False
+        self._savepoints = {}
     
     def __enter__(self):
         """Context manager - entrada"""
-        self.conn = get_db_connection()
+        self.scoped = has_request_context()
+        if self.scoped:
+            self.conn = _acquire_request_connection()
+        else:
+            self.conn = get_db_connection()
         self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager - salida"""
         if exc_type is not None:
-            # Si hubo un error, hacer rollback
-            self.conn.rollback()
             logger.error(f"Error en transacción: {exc_val}")
-        else:
-            # Si todo salió bien, hacer commit
-            self.conn.commit()
         
-        # Cerrar cursor y devolver conexión al pool
         if self.cursor:
             self.cursor.close()
-        if self.conn:
+        
+        if self.scoped:
+            _release_request_connection(exc_type is not None)
+            return
+        
+        try:
+            if exc_type is not None or self._failed:
+                # Si hubo un error, hacer rollback
+                self.conn.rollback()
+                return
+            # Si todo salió bien, hacer commit
+            self.conn.commit()
+        finally:
+            # Devolver conexión al pool
             return_db_connection(self.conn)
+        _run_after_commit(self._after_commit)
+    
+    def after_commit(self, callback):
+        """Ejecuta `callback` cuando la transacción se confirme
+
+        Dentro de un request se espera al bloque más externo. Si la
+        transacción termina en rollback el callback se descarta.
+        """
+        if self.scoped:
+            g._db_after_commit.append(callback)
+        else:
+            self._after_commit.append(callback)
+    
+    @property
+    def failed(self):
+        """Indica si la transacción terminará en rollback"""
+        return g._db_failed if self.scoped else self._failed
+    
+    def mark_failed(self):
+        """Hace que la transacción termine en rollback al salir"""
+        if self.scoped:
+            g._db_failed = True
+        else:
+            self._failed = True
+    
+    def savepoint(self, name):
+        """Abre un SAVEPOINT en la transacción actual"""
+        self.cursor.execute(f"SAVEPOINT {name}")
+        self._savepoints[name] = self.failed
+    
+    def rollback_to_savepoint(self, name):
+        """Deshace los cambios posteriores al SAVEPOINT
+
+        También se olvidan los errores ocurridos después de abrirlo, de modo
+        que la transacción puede confirmarse con lo anterior.
+        """
+        self.cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        failed = self._savepoints.pop(name)
+        if self.scoped:
+            g._db_failed = failed
+        else:
+            self._failed = failed
+    
+    def release_savepoint(self, name):
+        """Conserva los cambios posteriores al SAVEPOINT"""
+        self.cursor.execute(f"RELEASE SAVEPOINT {name}")
+        self._savepoints.pop(name, None)
+    
+    @contextmanager
+    def shared_with_subrequests(self):
+        """Permite despachar sub-requests que usan esta misma transacción
+
+        Dentro del bloque, los `with Database()` de otros contextos de
+        request de la misma aplicación comparten la conexión, y su teardown
+        no la libera. Solo tiene efecto dentro de un request.
+        """
+        if not self.scoped:
+            yield
+            return
+        g._db_hold = g.get('_db_hold', 0) + 1
+        try:
+            yield
+        finally:
+            g._db_hold -= 1
     
     def execute(self, query, params=None):
         """Ejecuta una consulta y retorna los resultados"""
@@ -87,6 +246,82 @@ class Database:
             logger.error(f"Params: {params}")
             raise
     
+    def stream(self, query, params=None, itersize=2000):
+        """Ejecuta una consulta con un cursor del lado del servidor y entrega
+        las filas de forma perezosa, trayendo `itersize` filas por viaje"""
+        cursor = self.conn.cursor(
+            name=f'stream_{uuid.uuid4().hex}',
+            cursor_factory=RealDictCursor
+        )
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        except Exception as e:
+            logger.error(f"Error ejecutando query en streaming: {e}")
+            logger.error(f"Query: {query}")
+            raise
+        finally:
+            cursor.close()
+    
+    def copy_to(self, query, params=None, chunk_size=65536):
+        """Ejecuta `COPY (query) TO STDOUT ...` y entrega los datos en
+        fragmentos de bytes conforme PostgreSQL los envía
+
+        `query` debe ser la sentencia COPY completa; los parámetros se
+        interpolan con mogrify porque COPY no acepta parámetros.
+        """
+        sql = self.cursor.mogrify(query, params)
+        chunks = queue.Queue(maxsize=256)
+        writer = _QueueWriter(chunks)
+        done = object()
+
+        def run_copy():
+            try:
+                self.cursor.copy_expert(sql, writer)
+                writer.put(done)
+            except Exception as e:
+                try:
+                    writer.put(e)
+                except IOError:
+                    pass  # El consumidor ya no está leyendo
+
+        thread = threading.Thread(target=run_copy, daemon=True)
+        thread.start()
+        terminado = False
+        try:
+            buffer = []
+            size = 0
+            while True:
+                item = chunks.get()
+                if item is done:
+                    terminado = True
+                    break
+                if isinstance(item, Exception):
+                    terminado = True
+                    logger.error(f"Error ejecutando COPY: {item}")
+                    logger.error(f"Query: {query}")
+                    raise item
+                buffer.append(item)
+                size += len(item)
+                if size >= chunk_size:
+                    yield b''.join(buffer)
+                    buffer = []
+                    size = 0
+            if buffer:
+                yield b''.join(buffer)
+        finally:
+            writer.cancelled = True
+            if not terminado and thread.is_alive():
+                # El consumidor abandonó la lectura: se cancela la consulta
+                # en el servidor. Sin esto el COPY seguiría hasta el final
+                # (libpq descarta lo que falta) reteniendo la conexión. El
+                # error de cancelación queda en el hilo y la transacción
+                # termina en rollback al salir del bloque.
+                self.conn.cancel()
+            thread.join()
+    
     def execute_one(self, query, params=None):
         """Ejecuta una consulta y retorna un solo resultado"""
         try:
@@ -111,6 +346,18 @@ class Database:
             logger.error(f"Error ejecutando INSERT: {e}")
             raise
     
+    def execute_values(self, query, rows, template=None, page_size=1000):
+        """Ejecuta un INSERT multi-fila (`VALUES %s`) y retorna los IDs insertados"""
+        try:
+            result = execute_values(
+                self.cursor, query + " RETURNING id", rows,
+                template=template, page_size=page_size, fetch=True
+            )
+            return [row['id'] for row in result]
+        except Exception as e:
+            logger.error(f"Error ejecutando INSERT multi-fila: {e}")
+            raise
+    
     def execute_update(self, query, params=None):
         """Ejecuta un UPDATE y retorna el número de filas afectadas"""
         try:
@@ -129,8 +376,82 @@ class Database:
             logger.error(f"Error ejecutando DELETE: {e}")
             raise
 
+class _QueueWriter:
+    """Objeto tipo archivo que pasa los datos de COPY a una cola acotada"""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.cancelled = False
+    
+    def put(self, item):
+        while True:
+            if self.cancelled:
+                raise IOError("COPY cancelado por el consumidor")
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+    
+    def write(self, data):
+        self.put(data)
+        return len(data)
+
+class Monto(dict):
+    """Valor del tipo compuesto `monto` (cantidad, moneda)
+
+    psycopg2 lo construye al leer columnas `monto` y lo adapta a
+    `ROW(cantidad, moneda)::monto` al usarlo como parámetro. Hereda de dict
+    para poder serializarse a JSON sin conversiones.
+    """
+    
+    def __init__(self, cantidad, moneda=None):
+        super().__init__(cantidad=float(cantidad), moneda=moneda or 'MXN')
+    
+    @property
+    def cantidad(self):
+        return self['cantidad']
+    
+    @property
+    def moneda(self):
+        return self['moneda']
+    
+    @classmethod
+    def from_json(cls, data):
+        """Crea un monto a partir de {'cantidad': ..., 'moneda': ...}"""
+        return cls(data['cantidad'], data.get('moneda'))
+
+class _MontoCaster(CompositeCaster):
+    """Decodifica el tipo compuesto monto directamente a Monto"""
+    
+    def make(self, values):
+        cantidad, moneda = values
+        return Monto(cantidad or 0.0, moneda)
+
+class _MontoAdapter:
+    """Adapta un Monto a ROW(cantidad, moneda)::monto"""
+    
+    def __init__(self, monto):
+        self.cantidad = adapt(monto.cantidad)
+        self.moneda = adapt(monto.moneda)
+    
+    def prepare(self, conn):
+        # Necesario para que la moneda use la codificación de la conexión
+        self.moneda.prepare(conn)
+    
+    def getquoted(self):
+        return b'ROW(' + self.cantidad.getquoted() + b', ' + self.moneda.getquoted() + b')::monto'
+
+register_adapter(Monto, _MontoAdapter)
+
 def format_monto(monto_tuple):
-    """Convierte una tupla de monto (cantidad, moneda) a diccionario"""
+    """Convierte un monto a diccionario (cantidad, moneda)
+
+    Las columnas monto ya llegan como Monto; se conserva la conversión
+    desde tupla o literal de texto por compatibilidad.
+    """
+    if isinstance(monto_tuple, dict):
+        return monto_tuple
     if monto_tuple and len(monto_tuple) >= 2:
         # Remover paréntesis si existen
         if isinstance(monto_tuple, str):
@@ -140,7 +461,3 @@ def format_monto(monto_tuple):
             'moneda': monto_tuple[1].strip('"').strip("'")
         }
     return {'cantidad': 0.0, 'moneda': 'MXN'}
-
-def create_monto_string(cantidad, moneda='MXN'):
-    """Crea una cadena de monto para insertar en la base de datos"""
-    return f"ROW({cantidad}, '{moneda}')::monto"
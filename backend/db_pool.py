@@ -0,0 +1,211 @@
+import collections
+import logging
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """No se liberó ninguna conexión dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """Pool de conexiones seguro entre hilos con espera acotada
+
+    A diferencia de SimpleConnectionPool, cuando todas las conexiones están
+    ocupadas `getconn` espera hasta `timeout` segundos a que se libere una.
+    Al entregar una conexión se descartan las cerradas, se reciclan las
+    que superan `max_lifetime` y se verifican con `SELECT 1` las que
+    estuvieron inactivas más de `check_idle_after` segundos.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=20, timeout=10.0,
+                 max_lifetime=3600.0, check_idle_after=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Valores inválidos para minconn/maxconn")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle_after = check_idle_after
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()  # (conexión, momento en que se devolvió)
+        self._created = {}  # id(conexión) -> momento de creación
+        self._in_use = set()
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Estadísticas acumuladas
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._broken = 0
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check(self, conn, returned_at):
+        """Verifica una conexión inactiva antes de entregarla
+
+        Retorna None si se puede usar, o el motivo para descartarla.
+        """
+        now = time.monotonic()
+        if conn.closed:
+            return 'broken'
+
+        if self.max_lifetime and now - self._created.get(id(conn), now) > self.max_lifetime:
+            return 'recycled'
+
+        if self.check_idle_after is not None and now - returned_at > self.check_idle_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return 'broken'
+
+        return None
+
+    def getconn(self, timeout=None):
+        """Obtiene una conexión, esperando a lo más `timeout` segundos"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolError("El pool de conexiones está cerrado")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Se reserva el lugar y la conexión se abre fuera del candado
+                    self._size += 1
+                    conn, returned_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    logger.warning(
+                        f"Tiempo de espera agotado por una conexión ({self._waiting} en espera)"
+                    )
+                    raise PoolTimeout(
+                        f"No hay conexiones disponibles después de {timeout} segundos"
+                    )
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            elapsed = time.monotonic() - start
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += elapsed
+                self._max_wait_time = max(self._max_wait_time, elapsed)
+
+        try:
+            motivo = self._check(conn, returned_at) if conn is not None else None
+            if motivo:
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    if motivo == 'recycled':
+                        self._recycled += 1
+                    else:
+                        self._broken += 1
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            # No se pudo abrir la conexión: se libera el lugar reservado
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.add(id(conn))
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Devuelve una conexión al pool"""
+        with self._cond:
+            if id(conn) not in self._in_use:
+                raise PoolError("La conexión no pertenece a este pool")
+            self._in_use.discard(id(conn))
+
+        if not conn.closed and not close:
+            try:
+                # Una conexión nunca vuelve al pool con una transacción abierta
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            if conn.closed or close or self._closed:
+                self._close(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Cierra las conexiones inactivas y las que se devuelvan después"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """Estadísticas del pool para dimensionarlo bajo carga"""
+        with self._cond:
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_total': round(self._wait_time, 6),
+                'wait_time_avg': round(self._wait_time / self._waits, 6) if self._waits else 0.0,
+                'wait_time_max': round(self._max_wait_time, 6),
+                'recycled': self._recycled,
+                'broken': self._broken
+            }
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g
 import jwt
 from config import Config
 import time
@@ -14,6 +14,31 @@ def create_token(user_id, username):
     token = jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
     return token
 
+def create_ticket(payload, audiencia, segundos):
+    """Crea un ticket de corta duración a partir de un token ya validado
+
+    Sirve para conexiones que no pueden enviar el encabezado Authorization
+    y deben pasar la credencial en la URL (p. ej. EventSource). Lleva la
+    expiración del token original en `sesion_exp`, y su audiencia hace que
+    decode_token lo rechace como token de sesión.
+    """
+    ticket = {
+        'user_id': payload['user_id'],
+        'username': payload['username'],
+        'sesion_exp': payload['exp'],
+        'aud': audiencia,
+        'exp': min(int(time.time()) + segundos, payload['exp'])
+    }
+    return jwt.encode(ticket, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
+
+def decode_ticket(ticket, audiencia):
+    """Decodifica un ticket de `create_ticket`; None si es inválido o expiró"""
+    try:
+        return jwt.decode(ticket, Config.JWT_SECRET_KEY,
+                          algorithms=[Config.JWT_ALGORITHM], audience=audiencia)
+    except jwt.InvalidTokenError:
+        return None
+
 def decode_token(token):
     """Decodifica un token JWT"""
     try:
@@ -46,6 +71,9 @@ def token_required(f):
         if not payload:
             return jsonify({'error': 'Token inválido o expirado'}), 401
         
+        # Dejar el usuario disponible para helpers del mismo request
+        g.current_user = payload
+        
         # Pasar información del usuario a la función
         return f(payload, *args, **kwargs)
     
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from database import get_db_connection, return_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Directorio con los archivos NNNN_nombre.sql
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'migrations'
+)
+
+# Llave del advisory lock que evita dos despliegues migrando a la vez
+MIGRATIONS_LOCK_KEY = 74837201
+
+# Los archivos que empiezan con esta marca se ejecutan fuera de una
+# transacción, sentencia por sentencia (p. ej. CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+
+_FILENAME_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+# Inicio de un cuerpo entre dólares: $$ o $etiqueta$
+_DOLLAR_TAG_RE = re.compile(r'\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$')
+
+# Índices creados con CONCURRENTLY en migraciones sin transacción
+_CONCURRENT_INDEX_RE = re.compile(
+    r'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)',
+    re.IGNORECASE
+)
+
+
+def split_statements(sql):
+    """Divide un script SQL en sentencias separadas por `;`
+
+    Respeta los `;` y `--` que aparecen dentro de literales ('...'),
+    identificadores ("..."), cuerpos entre dólares ($$...$$) y comentarios.
+    """
+    statements = []
+    current = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        c = sql[i]
+        if c == '-' and sql.startswith('--', i):
+            fin = sql.find('\n', i)
+            i = n if fin == -1 else fin
+            continue
+        if c == '/' and sql.startswith('/*', i):
+            fin = sql.find('*/', i + 2)
+            i = n if fin == -1 else fin + 2
+            current.append(' ')
+            continue
+        if c in ("'", '"'):
+            # Las comillas duplicadas ('' o "") quedan como dos literales seguidos
+            fin = sql.find(c, i + 1)
+            fin = n if fin == -1 else fin + 1
+            current.append(sql[i:fin])
+            i = fin
+            continue
+        if c == '$':
+            match = _DOLLAR_TAG_RE.match(sql, i)
+            if match and not (current and (current[-1][-1:].isalnum() or current[-1][-1:] == '_')):
+                tag = match.group(0)
+                fin = sql.find(tag, match.end())
+                fin = n if fin == -1 else fin + len(tag)
+                current.append(sql[i:fin])
+                i = fin
+                continue
+        if c == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+            continue
+        current.append(c)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+class Migration:
+    """Archivo de migración versionado"""
+
+    def __init__(self, version, nombre, path):
+        self.version = version
+        self.nombre = nombre
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+        self.transactional = not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        """Divide el archivo en sentencias (solo para migraciones sin transacción)"""
+        return split_statements(self.sql)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Lista las migraciones disponibles ordenadas por versión"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append(Migration(
+                match.group(1), match.group(2), os.path.join(directory, filename)
+            ))
+    migrations.sort(key=lambda m: int(m.version))
+    return migrations
+
+
+def _ensure_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                aplicada_en BIGINT NOT NULL
+            )
+            """
+        )
+    conn.commit()
+
+
+def _applied(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cursor.fetchall())
+    conn.commit()
+    return applied
+
+
+def _record(cursor, migration):
+    cursor.execute(
+        """
+        INSERT INTO schema_migrations (version, nombre, checksum, aplicada_en)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (migration.version, migration.nombre, migration.checksum, int(time.time()))
+    )
+
+
+def _apply(conn, migration):
+    if migration.transactional:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(migration.sql)
+                _record(cursor, migration)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return
+
+    # Sin transacción: cada sentencia debe ser idempotente (IF NOT EXISTS)
+    # para poder reintentar la migración si falla a la mitad. Los índices
+    # CONCURRENTLY que quedaron inválidos se reconstruyen al reintentar.
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in migration.statements():
+                match = _CONCURRENT_INDEX_RE.match(statement)
+                if match:
+                    _create_index_concurrently(cursor, match.group(1), statement)
+                else:
+                    cursor.execute(statement)
+            _record(cursor, migration)
+    finally:
+        conn.autocommit = False
+
+
+def _index_valid(cursor, nombre):
+    """True/False según pg_index.indisvalid, o None si el índice no existe"""
+    cursor.execute(
+        """
+        SELECT i.indisvalid
+        FROM pg_index i
+        WHERE i.indexrelid = to_regclass(%s)
+        """,
+        (nombre,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _create_index_concurrently(cursor, nombre, statement):
+    """Ejecuta un CREATE INDEX CONCURRENTLY IF NOT EXISTS
+
+    Si un intento anterior falló (duplicados, interrupción) el índice queda
+    creado pero marcado como inválido, e IF NOT EXISTS lo omitiría: se
+    elimina y se vuelve a construir. Si aun así queda inválido se lanza un
+    error en vez de registrar la migración.
+    """
+    if _index_valid(cursor, nombre) is False:
+        logger.warning(f"El índice {nombre} quedó inválido en un intento anterior, "
+                       f"se vuelve a crear")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+    cursor.execute(statement)
+    if not _index_valid(cursor, nombre):
+        raise RuntimeError(f"El índice {nombre} no quedó válido después de crearse")
+
+
+def migrate(log=logger.info):
+    """Aplica las migraciones pendientes y retorna las versiones aplicadas
+
+    Es idempotente: las versiones registradas en schema_migrations se
+    omiten. Un advisory lock de sesión serializa despliegues simultáneos.
+    """
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+        conn.autocommit = False
+
+        try:
+            _ensure_table(conn)
+            applied = _applied(conn)
+            nuevas = []
+            for migration in load_migrations():
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        log(f"Advertencia: la migración {migration.version} cambió "
+                            f"después de aplicarse")
+                    continue
+                log(f"Aplicando migración {migration.version}_{migration.nombre}...")
+                _apply(conn, migration)
+                nuevas.append(migration.version)
+            return nuevas
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+            conn.autocommit = False
+    finally:
+        return_db_connection(conn)
+
+
+def status():
+    """Retorna [(version, nombre, aplicada)] de todas las migraciones"""
+    conn = get_db_connection()
+    try:
+        _ensure_table(conn)
+        applied = _applied(conn)
+    finally:
+        return_db_connection(conn)
+    return [(m.version, m.nombre, m.version in applied) for m in load_migrations()]
+
+
+# Consultas frecuentes que deben resolverse con índices: (nombre, tablas
+# que no deben recorrerse completas, consulta)
+INDEXED_QUERIES = [
+    ('gastos por usuario y fecha', ['gastos'],
+     "SELECT id FROM gastos WHERE usuarioId = 1 ORDER BY fecha DESC, id DESC LIMIT 100"),
+    ('ingresos por usuario y fecha', ['ingresos'],
+     "SELECT id FROM ingresos WHERE usuarioId = 1 ORDER BY fecha DESC, id DESC LIMIT 100"),
+    ('gastos por categoría y rango de fechas', ['gastos'],
+     "SELECT id FROM gastos WHERE usuarioId = 1 AND categoriaId = 1 AND fecha >= 0"),
+    ('ingresos por categoría y rango de fechas', ['ingresos'],
+     "SELECT id FROM ingresos WHERE usuarioId = 1 AND categoriaId = 1 AND fecha >= 0"),
+    ('movimientos de una categoría', ['gastos', 'ingresos'],
+     "SELECT COUNT(*) FROM movimientos WHERE categoriaId = 1"),
+    ('presupuestos por usuario', ['presupuestos'],
+     "SELECT id FROM presupuestos WHERE usuarioId = 1 ORDER BY fecha_creacion DESC"),
+    ('metas por usuario', ['metas'],
+     "SELECT id FROM metas WHERE usuarioId = 1"),
+    ('contribuciones de una meta', ['meta_contribuciones'],
+     "SELECT id FROM meta_contribuciones WHERE metaId = 1 AND usuarioId = 1 "
+     "ORDER BY fecha DESC, id DESC LIMIT 100"),
+    ('analítica diaria por usuario', ['movimientos_diarios'],
+     "SELECT dia FROM movimientos_diarios WHERE usuarioId = 1 AND dia >= 0"),
+    ('cambios para sincronizar', ['cambios_sync'],
+     "SELECT registro_id FROM cambios_sync WHERE usuarioId = 1 AND recurso = 'gastos' "
+     "AND txid >= '1'::xid8"),
+    ('búsqueda de texto en gastos', ['gastos'],
+     "SELECT id FROM gastos WHERE usuarioId = 1 "
+     "AND busqueda @@ websearch_to_tsquery('spanish', 'super')"),
+    ('búsqueda por trigramas en ingresos', ['ingresos'],
+     "SELECT id FROM ingresos WHERE usuarioId = 1 AND 'salrio' <% busqueda_texto"),
+]
+
+
+_PARTITION_RE = re.compile(r'^(\w+?)_(p\d{4}_\d{2}|default)$')
+
+
+def _tabla_base(relacion):
+    """Nombre de la tabla particionada a la que pertenece una partición"""
+    match = _PARTITION_RE.match(relacion)
+    return match.group(1) if match else relacion
+
+
+def _seq_scans(plan, tablas):
+    """Tablas de `tablas` que aparecen con Seq Scan en un plan JSON"""
+    encontrados = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        relacion = plan.get('Relation Name', '')
+        if _tabla_base(relacion) in tablas:
+            encontrados.add(relacion)
+    for child in plan.get('Plans', []):
+        encontrados |= _seq_scans(child, tablas)
+    return encontrados
+
+
+def check_indexes():
+    """Verifica con EXPLAIN que las consultas frecuentes usan índices
+
+    Se desactiva el Seq Scan para que el resultado no dependa del tamaño
+    actual de las tablas: si aún así aparece, no hay índice utilizable.
+    Retorna [(nombre, tablas recorridas completas)].
+    """
+    conn = get_db_connection()
+    resultados = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for nombre, tablas, query in INDEXED_QUERIES:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                resultados.append((nombre, sorted(_seq_scans(plan[0]['Plan'], tablas))))
+    finally:
+        conn.rollback()
+        return_db_connection(conn)
+    return resultados
@@ -0,0 +1,35 @@
+import base64
+import json
+
+# Tamaño máximo de página para las rutas paginadas por cursor
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se pudo decodificar"""
+
+
+def encode_cursor(*values):
+    """Codifica los valores de la clave de ordenamiento en un cursor opaco"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decodifica un cursor opaco y valida que tenga `size` valores"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Cursor inválido')
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Cursor inválido')
+    return values
+
+
+def page_size(limit, default=100):
+    """Normaliza el tamaño de página solicitado"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
@@ -0,0 +1,167 @@
+import math
+import numpy as np
+
+SEGUNDOS_DIA = 86400
+# Días por mes, igual que la ventana de los presupuestos mensuales
+DIAS_MES = 30
+
+
+def _opcional(valor):
+    """Convierte NaN/infinito en None para la respuesta JSON"""
+    return valor if math.isfinite(valor) else None
+
+
+def proyectar_metas(metas, contribuciones, ahora, ventana_dias=90):
+    """Proyecta la fecha de término y el aporte mensual de varias metas
+
+    `metas` son filas con id, monto_objetivo, monto_actual, fecha_limite y
+    fecha_creacion; `contribuciones` son filas (meta_id, fecha, cantidad)
+    del historial. El ritmo de ahorro de cada meta es lo aportado en los
+    últimos `ventana_dias` días (o desde su creación, si es más reciente)
+    entre los días observados. Todas las metas se calculan a la vez con
+    operaciones vectorizadas; retorna un dict por meta, en el mismo orden.
+    """
+    n = len(metas)
+    if n == 0:
+        return []
+
+    ids = np.array([m['id'] for m in metas], dtype=np.int64)
+    objetivo = np.array([m['monto_objetivo'].cantidad for m in metas], dtype=np.float64)
+    actual = np.array([m['monto_actual'].cantidad for m in metas], dtype=np.float64)
+    creacion = np.array([m['fecha_creacion'] for m in metas], dtype=np.float64)
+    limite = np.array(
+        [np.nan if m['fecha_limite'] is None else m['fecha_limite'] for m in metas],
+        dtype=np.float64
+    )
+
+    # Inicio del periodo observado de cada meta
+    inicio = np.maximum(creacion, ahora - ventana_dias * SEGUNDOS_DIA)
+    dias_observados = np.maximum((ahora - inicio) / SEGUNDOS_DIA, 1.0)
+
+    # Suma de las contribuciones dentro del periodo observado, por meta
+    aportado = np.zeros(n)
+    if contribuciones:
+        meta_ids = np.array([c['meta_id'] for c in contribuciones], dtype=np.int64)
+        fechas = np.array([c['fecha'] for c in contribuciones], dtype=np.float64)
+        cantidades = np.array([c['cantidad'] for c in contribuciones], dtype=np.float64)
+
+        orden = np.argsort(ids)
+        posicion = orden[np.searchsorted(ids, meta_ids, sorter=orden)]
+        dentro = fechas >= inicio[posicion]
+        aportado = np.bincount(posicion, weights=cantidades * dentro, minlength=n)
+
+    ritmo_diario = aportado / dias_observados
+    restante = np.maximum(objetivo - actual, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_restantes = np.where(
+            restante <= 0, 0.0,
+            np.where(ritmo_diario > 0, restante / ritmo_diario, np.inf)
+        )
+        # Con la fecha límite vencida o a menos de un mes, falta todo este mes
+        meses_limite = (limite - ahora) / (DIAS_MES * SEGUNDOS_DIA)
+        aporte_requerido = restante / np.maximum(meses_limite, 1.0)
+
+    fecha_estimada = np.ceil(ahora + dias_restantes * SEGUNDOS_DIA)
+    en_camino = fecha_estimada <= limite
+    sin_limite = np.isnan(limite)
+
+    return [
+        {
+            'ritmo_mensual': ritmo * DIAS_MES,
+            'restante': falta,
+            'fecha_estimada': None if math.isinf(fecha) else int(fecha),
+            'aporte_mensual_requerido': _opcional(requerido),
+            'en_camino': None if libre else bool(camino)
+        }
+        for ritmo, falta, fecha, requerido, camino, libre in zip(
+            ritmo_diario.tolist(), restante.tolist(), fecha_estimada.tolist(),
+            aporte_requerido.tolist(), en_camino.tolist(), sin_limite.tolist()
+        )
+    ]
+
+
+def pronosticar_presupuestos(presupuestos, hoy, historia_max=365):
+    """Pronostica el gasto de varios presupuestos y cuándo excederán su límite
+
+    Cada fila de `presupuestos` trae limite, ventana_dias (días de su
+    ventana móvil), historia (días de gasto observados) y la serie de gasto
+    diario como listas paralelas dias_serie/totales (días UTC desde epoch,
+    hasta `hoy` inclusive). Para todos los presupuestos a la vez se ajusta
+    una recta por mínimos cuadrados al gasto diario de su historia, se
+    extrapola a los días siguientes y se calcula la suma móvil de la
+    ventana para cada día futuro. Retorna un dict por presupuesto:
+
+    - gasto_diario_estimado: gasto estimado para mañana según la tendencia
+    - tendencia_diaria: cambio del gasto diario por día (pendiente)
+    - gasto_proyectado: gasto estimado de los próximos `ventana_dias` días
+    - fecha_excedido: inicio del día en que la ventana superaría el límite
+      (hoy si ya lo supera; None si no ocurre en los próximos días)
+    """
+    n = len(presupuestos)
+    if n == 0:
+        return []
+
+    limite = np.array([p['limite'] for p in presupuestos], dtype=np.float64)
+    ventana = np.array([p['ventana_dias'] for p in presupuestos], dtype=np.int64)
+    historia = np.array([p['historia'] for p in presupuestos], dtype=np.int64)
+    h = max(int(historia.max()), int(ventana.max()), 1)
+    f = int(ventana.max())
+
+    # Matriz de gasto diario: fila por presupuesto, columna j = día hoy - h + 1 + j
+    serie = np.zeros((n, h))
+    filas = [np.full(len(p['dias_serie'] or []), i) for i, p in enumerate(presupuestos)]
+    if any(len(fila) for fila in filas):
+        fila = np.concatenate(filas)
+        dia = np.concatenate([np.asarray(p['dias_serie'] or [], dtype=np.int64) for p in presupuestos])
+        total = np.concatenate([np.asarray(p['totales'] or [], dtype=np.float64) for p in presupuestos])
+        np.add.at(serie, (fila, dia - (hoy - h + 1)), total)
+
+    # Mínimos cuadrados por fila sobre los últimos `historia` días
+    t = np.arange(h, dtype=np.float64)
+    peso = (t[None, :] >= (h - historia)[:, None]).astype(np.float64)
+    cuenta = peso.sum(axis=1)
+    st = (peso * t).sum(axis=1)
+    sy = (peso * serie).sum(axis=1)
+    stt = (peso * t * t).sum(axis=1)
+    sty = (peso * t * serie).sum(axis=1)
+    denominador = cuenta * stt - st * st
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pendiente = np.where(denominador > 0, (cuenta * sty - st * sy) / denominador, 0.0)
+    ordenada = (sy - pendiente * st) / cuenta
+
+    # Gasto diario extrapolado (nunca negativo) para los días hoy+1 .. hoy+f
+    futuro = np.arange(h, h + f, dtype=np.float64)
+    estimado = np.maximum(ordenada[:, None] + pendiente[:, None] * futuro[None, :], 0.0)
+
+    # Suma móvil de la ventana terminando en hoy+k, para k = 0..f
+    acumulado = np.concatenate(
+        [np.zeros((n, 1)), np.cumsum(np.concatenate([serie, estimado], axis=1), axis=1)],
+        axis=1
+    )
+    k = np.arange(f + 1)
+    fin = h + k[None, :]
+    inicio = fin - ventana[:, None]
+    suma_ventana = (
+        np.take_along_axis(acumulado, np.broadcast_to(fin, (n, f + 1)), axis=1)
+        - np.take_along_axis(acumulado, inicio, axis=1)
+    )
+
+    # Primer día (dentro de la siguiente ventana) en que se supera el límite
+    excede = (suma_ventana > limite[:, None]) & (k[None, :] <= ventana[:, None])
+    alguno = excede.any(axis=1)
+    primer_k = np.argmax(excede, axis=1)
+    proyectado = suma_ventana[np.arange(n), ventana]
+
+    return [
+        {
+            'gasto_diario_estimado': diario,
+            'tendencia_diaria': tendencia,
+            'gasto_proyectado': gasto,
+            'fecha_excedido': int((hoy + dias) * SEGUNDOS_DIA) if excedido else None
+        }
+        for diario, tendencia, gasto, dias, excedido in zip(
+            estimado[:, 0].tolist(), pendiente.tolist(), proyectado.tolist(),
+            primer_k.tolist(), alguno.tolist()
+        )
+    ]
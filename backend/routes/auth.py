@@ -6,6 +6,19 @@ from middleware import create_token
 
 auth_bp = Blueprint('auth', __name__)
 
+# Categorías que se crean para cada usuario nuevo: (nombre, tipo, descripción)
+CATEGORIAS_POR_DEFECTO = [
+    ('Alimentación', 'gasto', 'Supermercado, restaurantes, comida'),
+    ('Transporte', 'gasto', 'Gasolina, transporte público'),
+    ('Vivienda', 'gasto', 'Renta, servicios, mantenimiento'),
+    ('Entretenimiento', 'gasto', 'Cine, streaming, salidas'),
+    ('Salud', 'gasto', 'Médico, farmacia, seguro'),
+    ('Otros Gastos', 'gasto', 'Gastos varios'),
+    ('Salario', 'ingreso', 'Sueldo mensual'),
+    ('Freelance', 'ingreso', 'Trabajos independientes'),
+    ('Otros Ingresos', 'ingreso', 'Ingresos varios')
+]
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Registra un nuevo usuario"""
@@ -29,62 +42,40 @@ def register():
         
         # Hash de la contraseña
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        timestamp = int(time.time())
         
-        # Insertar usuario en la base de datos
+        # Insertar usuario y sus categorías por defecto en una sola sentencia;
+        # si el usuario o email ya existen no se inserta nada
         with Database() as db:
-            # Verificar si el usuario ya existe
-            existing_user = db.execute_one(
-                "SELECT id FROM usuarios WHERE username = %s OR email = %s",
-                (username, email)
-            )
-            
-            if existing_user:
-                return jsonify({'error': 'El usuario o email ya existe'}), 409
-            
-            # Insertar nuevo usuario
-            user_id = db.execute_insert(
+            nuevo = db.execute_one(
                 """
-                INSERT INTO usuarios (username, password_hash, nombre_completo, email, fecha_registro)
-                VALUES (%s, %s, %s, %s, %s)
+                WITH nuevo AS (
+                    INSERT INTO usuarios (username, password_hash, nombre_completo, email, fecha_registro)
+                    SELECT %s, %s, %s, %s, %s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM usuarios WHERE username = %s OR email = %s
+                    )
+                    ON CONFLICT (username) DO NOTHING
+                    RETURNING id
+                ), categorias_nuevas AS (
+                    INSERT INTO categorias (usuarioId, nombre, tipo, descripcion, fecha)
+                    SELECT nuevo.id, c.nombre, c.tipo::tipo_categoria, c.descripcion, %s
+                    FROM nuevo
+                    CROSS JOIN unnest(%s::TEXT[], %s::TEXT[], %s::TEXT[]) AS c(nombre, tipo, descripcion)
+                )
+                SELECT id FROM nuevo
                 """,
-                (username, password_hash, nombre_completo, email, int(time.time()))
+                (username, password_hash, nombre_completo, email, timestamp,
+                 username, email, timestamp,
+                 [c[0] for c in CATEGORIAS_POR_DEFECTO],
+                 [c[1] for c in CATEGORIAS_POR_DEFECTO],
+                 [c[2] for c in CATEGORIAS_POR_DEFECTO])
             )
             
-            # Crear categorías por defecto para el nuevo usuario
-            categorias_gastos = [
-                ('Alimentación', 'Supermercado, restaurantes, comida'),
-                ('Transporte', 'Gasolina, transporte público'),
-                ('Vivienda', 'Renta, servicios, mantenimiento'),
-                ('Entretenimiento', 'Cine, streaming, salidas'),
-                ('Salud', 'Médico, farmacia, seguro'),
-                ('Otros Gastos', 'Gastos varios')
-            ]
-            
-            categorias_ingresos = [
-                ('Salario', 'Sueldo mensual'),
-                ('Freelance', 'Trabajos independientes'),
-                ('Otros Ingresos', 'Ingresos varios')
-            ]
-            
-            timestamp = int(time.time())
-            
-            for nombre, desc in categorias_gastos:
-                db.execute(
-                    """
-                    INSERT INTO categorias (usuarioId, nombre, tipo, descripcion, fecha)
-                    VALUES (%s, %s, 'gasto', %s, %s)
-                    """,
-                    (user_id, nombre, desc, timestamp)
-                )
+            if not nuevo:
+                return jsonify({'error': 'El usuario o email ya existe'}), 409
             
-            for nombre, desc in categorias_ingresos:
-                db.execute(
-                    """
-                    INSERT INTO categorias (usuarioId, nombre, tipo, descripcion, fecha)
-                    VALUES (%s, %s, 'ingreso', %s, %s)
-                    """,
-                    (user_id, nombre, desc, timestamp)
-                )
+            user_id = nuevo['id']
         
         # Crear token
         token = create_token(user_id, username)
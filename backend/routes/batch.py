@@ -0,0 +1,125 @@
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import HTTPException
+from database import Database
+from middleware import token_required
+from cache import invalidar_categorias
+
+batch_bp = Blueprint('batch', __name__)
+
+# Máximo de operaciones por lote
+MAX_BATCH_OPERATIONS = 100
+
+# Solo escrituras: las lecturas en streaming no se pueden anidar
+METODOS_PERMITIDOS = ('POST', 'PUT', 'DELETE')
+
+# Rutas que se pueden despachar dentro de un lote
+PREFIJOS_PERMITIDOS = (
+    '/api/movimientos/', '/api/categorias', '/api/presupuestos', '/api/metas'
+)
+
+
+def _validar_operacion(operacion):
+    """Retorna (método, ruta, cuerpo) de una operación; lanza ValueError"""
+    if not isinstance(operacion, dict):
+        raise ValueError('La operación debe ser un objeto')
+    
+    metodo = str(operacion.get('method', '')).upper()
+    ruta = operacion.get('path')
+    if metodo not in METODOS_PERMITIDOS:
+        raise ValueError('method debe ser POST, PUT o DELETE')
+    if not isinstance(ruta, str) or not ruta.startswith(PREFIJOS_PERMITIDOS):
+        raise ValueError(f'Ruta no permitida en un lote: {ruta}')
+    
+    return metodo, ruta, operacion.get('body')
+
+
+def _despachar(app, metodo, ruta, cuerpo, authorization):
+    """Ejecuta una operación con la ruta existente; retorna (status, cuerpo)"""
+    kwargs = {'method': metodo, 'headers': {'Authorization': authorization}}
+    if cuerpo is not None:
+        kwargs['json'] = cuerpo
+    
+    with app.test_request_context(ruta, **kwargs):
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            return e.code, {'error': e.description}
+    
+    return response.status_code, response.get_json(silent=True)
+
+
+@batch_bp.route('', methods=['POST'])
+@token_required
+def ejecutar_lote(current_user):
+    """Ejecuta una lista ordenada de operaciones en una sola transacción
+
+    Cuerpo: `{"operaciones": [{"method", "path", "body"}, ...]}`. Cada
+    operación se despacha a la ruta existente (con el mismo token) sobre la
+    conexión del lote. Por omisión es todo o nada: la primera operación con
+    error deshace las anteriores y detiene el lote. Con `"modo": "parcial"`
+    cada operación corre en su propio SAVEPOINT y solo se deshacen las que
+    fallan. Respuesta: un resultado `{status, body}` por operación.
+    """
+    try:
+        data = request.get_json()
+        operaciones = data.get('operaciones') if isinstance(data, dict) else None
+        parcial = isinstance(data, dict) and data.get('modo') == 'parcial'
+        
+        if not isinstance(operaciones, list) or not operaciones:
+            return jsonify({'error': 'Se requiere una lista de operaciones'}), 400
+        
+        if len(operaciones) > MAX_BATCH_OPERATIONS:
+            return jsonify({
+                'error': f'Máximo {MAX_BATCH_OPERATIONS} operaciones por lote'
+            }), 400
+        
+        try:
+            validas = [_validar_operacion(operacion) for operacion in operaciones]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        app = current_app._get_current_object()
+        authorization = request.headers.get('Authorization')
+        resultados = []
+        fallida = None
+        deshecho = False
+        
+        try:
+            with Database() as db, db.shared_with_subrequests():
+                for numero, (metodo, ruta, cuerpo) in enumerate(validas, start=1):
+                    if parcial:
+                        db.savepoint('operacion_lote')
+                    
+                    status, body = _despachar(app, metodo, ruta, cuerpo, authorization)
+                    resultados.append({'status': status, 'body': body})
+                    fallo = not 200 <= status < 300 or db.failed
+                    
+                    if parcial:
+                        if fallo:
+                            db.rollback_to_savepoint('operacion_lote')
+                            deshecho = True
+                        else:
+                            db.release_savepoint('operacion_lote')
+                    elif fallo:
+                        db.mark_failed()
+                        fallida = numero
+                        break
+        except Exception:
+            deshecho = True
+            raise
+        finally:
+            # Las invalidaciones de after_commit se descartan con el rollback:
+            # no debe quedar en caché nada leído dentro de lo que se deshizo
+            if deshecho or fallida is not None:
+                invalidar_categorias(current_user['user_id'])
+        
+        if fallida is not None:
+            return jsonify({
+                'error': f'La operación {fallida} falló, no se aplicó ningún cambio',
+                'resultados': resultados
+            }), 400
+        
+        return jsonify({'resultados': resultados}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
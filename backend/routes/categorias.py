@@ -1,40 +1,25 @@
 from flask import Blueprint, request, jsonify
 from database import Database
 from middleware import token_required
+from conditional import conditional_get, version_leida
+from cache import get_categorias_usuario, invalidar_categorias
 import time
 
 categorias_bp = Blueprint('categorias', __name__)
 
 @categorias_bp.route('', methods=['GET'])
 @token_required
+@conditional_get('categorias')
 def get_categorias(current_user):
     """Obtiene todas las categorías del usuario"""
     try:
         tipo = request.args.get('tipo')  # 'gasto' o 'ingreso'
         
-        with Database() as db:
-            if tipo:
-                categorias = db.execute(
-                    """
-                    SELECT id, nombre, tipo, descripcion, fecha
-                    FROM categorias
-                    WHERE usuarioId = %s AND tipo = %s
-                    ORDER BY nombre
-                    """,
-                    (current_user['user_id'], tipo)
-                )
-            else:
-                categorias = db.execute(
-                    """
-                    SELECT id, nombre, tipo, descripcion, fecha
-                    FROM categorias
-                    WHERE usuarioId = %s
-                    ORDER BY tipo, nombre
-                    """,
-                    (current_user['user_id'],)
-                )
-            
-            return jsonify([dict(cat) for cat in categorias]), 200
+        categorias = get_categorias_usuario(
+            current_user['user_id'], tipo, version_minima=version_leida('categorias')
+        )
+        
+        return jsonify(categorias), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -60,24 +45,21 @@ def create_categoria(current_user):
             return jsonify({'error': 'Tipo debe ser "gasto" o "ingreso"'}), 400
         
         with Database() as db:
-            # Verificar si ya existe una categoría con ese nombre para el usuario
-            existing = db.execute_one(
-                "SELECT id FROM categorias WHERE usuarioId = %s AND nombre = %s",
-                (current_user['user_id'], nombre)
-            )
-            
-            if existing:
-                return jsonify({'error': 'Ya existe una categoría con ese nombre'}), 409
-            
-            # Insertar categoría
+            # Insertar categoría; UNIQUE (usuarioId, nombre) descarta duplicados
             categoria_id = db.execute_insert(
                 """
                 INSERT INTO categorias (usuarioId, nombre, tipo, descripcion, fecha)
                 VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (usuarioId, nombre) DO NOTHING
                 """,
                 (current_user['user_id'], nombre, tipo, descripcion, int(time.time()))
             )
             
+            if not categoria_id:
+                return jsonify({'error': 'Ya existe una categoría con ese nombre'}), 409
+            
+            db.after_commit(lambda: invalidar_categorias(current_user['user_id']))
+            
             return jsonify({
                 'message': 'Categoría creada exitosamente',
                 'id': categoria_id,
@@ -131,6 +113,7 @@ def update_categoria(current_user, categoria_id):
             """
             
             db.execute_update(query, params)
+            db.after_commit(lambda: invalidar_categorias(current_user['user_id']))
             
             return jsonify({'message': 'Categoría actualizada exitosamente'}), 200
             
@@ -169,6 +152,7 @@ def delete_categoria(current_user, categoria_id):
                 "DELETE FROM categorias WHERE id = %s AND usuarioId = %s",
                 (categoria_id, current_user['user_id'])
             )
+            db.after_commit(lambda: invalidar_categorias(current_user['user_id']))
             
             return jsonify({'message': 'Categoría eliminada exitosamente'}), 200
             
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import Blueprint, request, jsonify
+from config import Config
+from database import Database
+from middleware import token_required
+from conditional import conditional_get, version_leida
+from cache import get_categorias_usuario
+from pagination import page_size
+from routes.movimientos import resumen_usuario, movimientos_recientes
+from routes.presupuestos import estados_presupuestos
+from routes.metas import listar_metas
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Hilos compartidos por todos los requests; cada consulta usa su propia
+# conexión del pool, así que no debe superar DB_POOL_MAX
+_executor = ThreadPoolExecutor(
+    max_workers=Config.DASHBOARD_WORKERS,
+    thread_name_prefix='dashboard'
+)
+
+
+def _ejecutar_en_paralelo(tareas, limite):
+    """Ejecuta {nombre: función} en los hilos, a lo más `limite` a la vez
+
+    Las tareas restantes se envían conforme terminan las anteriores, de
+    modo que un request no ocupa más de `limite` hilos ni conexiones.
+    Retorna {nombre: resultado}; si una tarea falla se propaga su error.
+    """
+    pendientes = list(tareas.items())
+    en_curso = {}
+    resultados = {}
+    try:
+        while pendientes or en_curso:
+            while pendientes and len(en_curso) < limite:
+                nombre, funcion = pendientes.pop(0)
+                en_curso[_executor.submit(funcion)] = nombre
+            terminadas, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminadas:
+                resultados[en_curso.pop(futuro)] = futuro.result()
+    finally:
+        for futuro in en_curso:
+            futuro.cancel()
+    return resultados
+
+
+# Las funciones siguientes se ejecutan fuera del contexto del request: cada
+# `with Database()` toma y devuelve su propia conexión del pool
+
+def _resumen(usuario_id):
+    with Database() as db:
+        return resumen_usuario(db, usuario_id)
+
+
+def _estados_presupuestos(usuario_id):
+    with Database() as db:
+        return estados_presupuestos(db, usuario_id)
+
+
+def _metas(usuario_id):
+    with Database() as db:
+        return listar_metas(db, usuario_id)
+
+
+def _recientes(usuario_id, tabla, columna, limit):
+    with Database() as db:
+        return movimientos_recientes(db, usuario_id, tabla, columna, limit)
+
+
+@dashboard_bp.route('', methods=['GET'])
+@token_required
+@conditional_get('categorias', 'gastos', 'ingresos', 'presupuestos', 'metas', por_dia=True)
+def get_dashboard(current_user):
+    """Obtiene todos los datos del dashboard en una sola respuesta
+
+    Incluye resumen, estado de los presupuestos, metas, categorías y los
+    últimos gastos e ingresos (`?recientes=N`, 10 por omisión). Las
+    consultas son independientes y se ejecutan en paralelo, cada una con
+    su propia conexión, por lo que no comparten una misma transacción.
+    """
+    try:
+        usuario_id = current_user['user_id']
+        recientes = page_size(request.args.get('recientes', type=int), default=10)
+        # Los hilos no tienen el contexto del request: se pasa la versión
+        version_categorias = version_leida('categorias')
+        
+        datos = _ejecutar_en_paralelo({
+            'resumen': lambda: _resumen(usuario_id),
+            'presupuestos': lambda: _estados_presupuestos(usuario_id),
+            'metas': lambda: _metas(usuario_id),
+            'categorias': lambda: get_categorias_usuario(
+                usuario_id, version_minima=version_categorias
+            ),
+            'gastos': lambda: _recientes(usuario_id, 'gastos', 'detalle', recientes),
+            'ingresos': lambda: _recientes(usuario_id, 'ingresos', 'fuente', recientes)
+        }, limite=Config.DASHBOARD_MAX_CONCURRENCIA)
+        
+        return jsonify(datos), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from flask import Blueprint, request, jsonify, current_app
+from config import Config
+from database import Database
+from middleware import token_required, decode_token, create_ticket, decode_ticket
+from bus import bus
+from streaming import stream_response
+from routes.movimientos import resumen_usuario
+from routes.presupuestos import estados_presupuestos
+
+eventos_bp = Blueprint('eventos', __name__)
+
+# Recursos cuyos cambios afectan el balance o el estado de los presupuestos
+RECURSOS_EVENTOS = {'gastos', 'ingresos', 'presupuestos', 'categorias'}
+
+# Audiencia de los tickets que solo sirven para abrir /api/eventos
+AUDIENCIA_TICKET = 'eventos'
+
+# usuarioId -> colas de los clientes conectados en este proceso
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def _on_cambio(usuario_id, recurso):
+    """Reenvía los avisos del bus a las colas de los clientes del usuario"""
+    if usuario_id is not None and recurso not in RECURSOS_EVENTOS:
+        return
+    
+    with _clientes_lock:
+        if usuario_id is None:
+            colas = [cola for colas in _clientes.values() for cola in colas]
+        else:
+            colas = list(_clientes.get(usuario_id, ()))
+    
+    for cola in colas:
+        try:
+            cola.put_nowait(recurso)
+        except queue.Full:
+            pass  # Ya hay una actualización pendiente para ese cliente
+
+
+bus.subscribe(_on_cambio)
+
+
+def _registrar(usuario_id):
+    with _clientes_lock:
+        if sum(len(colas) for colas in _clientes.values()) >= Config.SSE_MAX_CLIENTES:
+            return None
+        cola = queue.Queue(maxsize=100)
+        _clientes.setdefault(usuario_id, set()).add(cola)
+        return cola
+
+
+def _eliminar(usuario_id, cola):
+    with _clientes_lock:
+        colas = _clientes.get(usuario_id)
+        if colas is not None:
+            colas.discard(cola)
+            if not colas:
+                del _clientes[usuario_id]
+
+
+def _leer_estado(usuario_id):
+    """Balance y estado de los presupuestos (la conexión se devuelve al salir)"""
+    with Database() as db:
+        return resumen_usuario(db, usuario_id), estados_presupuestos(db, usuario_id)
+
+
+@eventos_bp.route('/ticket', methods=['POST'])
+@token_required
+def crear_ticket(current_user):
+    """Crea un ticket de corta duración para abrir /api/eventos
+
+    EventSource no permite encabezados, así que la credencial viaja en la
+    URL (`?ticket=`) y queda en los logs de acceso y de proxies. Por eso
+    no se usa el token de sesión: el ticket solo sirve para conectarse a
+    los eventos y expira en SSE_TICKET_SEGUNDOS.
+    """
+    try:
+        ticket = create_ticket(current_user, AUDIENCIA_TICKET, Config.SSE_TICKET_SEGUNDOS)
+        return jsonify({'ticket': ticket, 'expira_en': Config.SSE_TICKET_SEGUNDOS}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _autenticar_stream():
+    """Retorna (usuario_id, expiración de la sesión) o None"""
+    ticket = request.args.get('ticket')
+    if ticket:
+        payload = decode_ticket(ticket, AUDIENCIA_TICKET)
+        return (payload['user_id'], payload['sesion_exp']) if payload else None
+    
+    if 'Authorization' in request.headers:
+        payload = decode_token(request.headers['Authorization'].split(' ')[-1])
+        return (payload['user_id'], payload['exp']) if payload else None
+    
+    return None
+
+
+@eventos_bp.route('', methods=['GET'])
+def stream_eventos():
+    """Envía por Server-Sent Events los cambios de balance y presupuestos
+
+    Se autentica con el encabezado Authorization o, desde EventSource, con
+    `?ticket=` (ver /api/eventos/ticket). Eventos: `balance` (como
+    /api/movimientos/resumen), `presupuestos` (como
+    /api/presupuestos/estados), `alerta` cuando un presupuesto cambia de
+    estado y `expirado` antes de cerrar el stream al vencer la sesión. Los
+    avisos llegan por LISTEN/NOTIFY (bus.py): entre eventos el cliente no
+    ocupa ninguna conexión del pool.
+    """
+    if not request.args.get('ticket') and 'Authorization' not in request.headers:
+        return jsonify({'error': 'Token no proporcionado'}), 401
+    
+    autenticado = _autenticar_stream()
+    if not autenticado:
+        return jsonify({'error': 'Token inválido o expirado'}), 401
+    
+    usuario_id, expira = autenticado
+    cola = _registrar(usuario_id)
+    if cola is None:
+        return jsonify({'error': 'Demasiadas conexiones de eventos'}), 503
+    
+    dumps = current_app.json.dumps
+    
+    def evento(nombre, data):
+        return f"event: {nombre}\ndata: {dumps(data)}\n\n"
+    
+    def generate():
+        try:
+            anteriores = None
+            while True:
+                balance, estados = _leer_estado(usuario_id)
+                yield evento('balance', balance)
+                yield evento('presupuestos', estados)
+                
+                actuales = {estado['id']: estado['estado'] for estado in estados}
+                if anteriores is not None:
+                    for estado in estados:
+                        anterior = anteriores.get(estado['id'])
+                        if anterior is not None and anterior != estado['estado']:
+                            yield evento('alerta', {
+                                'id': estado['id'],
+                                'categoria_nombre': estado['categoria_nombre'],
+                                'estado': estado['estado'],
+                                'anterior': anterior
+                            })
+                anteriores = actuales
+                
+                # Esperar el siguiente aviso; el comentario periódico detecta
+                # clientes desconectados y mantiene abiertos los proxies. Al
+                # expirar la sesión se cierra el stream.
+                while True:
+                    restante = expira - time.time()
+                    if restante <= 0:
+                        yield evento('expirado', {'error': 'Token expirado'})
+                        return
+                    try:
+                        cola.get(timeout=min(Config.SSE_HEARTBEAT, restante))
+                        break
+                    except queue.Empty:
+                        yield ": ping\n\n"
+                
+                # Varios avisos seguidos producen una sola actualización
+                while True:
+                    try:
+                        cola.get_nowait()
+                    except queue.Empty:
+                        break
+        finally:
+            _eliminar(usuario_id, cola)
+    
+    try:
+        return stream_response(
+            generate(),
+            'text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,48 +1,119 @@
 from flask import Blueprint, request, jsonify
-from database import Database, format_monto
+from database import Database, Monto
 from middleware import token_required
+from conditional import conditional_get
+from pagination import encode_cursor, decode_cursor, page_size, InvalidCursor
+from proyecciones import proyectar_metas
+import math
 import time
 
 metas_bp = Blueprint('metas', __name__)
 
+# Días de historial de contribuciones usados para estimar el ritmo de ahorro
+VENTANA_PROYECCION_DIAS = 90
+
+
+def _proyectar(db, metas):
+    """Proyecciones de varias metas con una sola consulta al historial"""
+    ahora = int(time.time())
+    contribuciones = db.execute(
+        """
+        SELECT metaId AS meta_id, fecha, cantidad
+        FROM meta_contribuciones
+        WHERE metaId = ANY(%s) AND fecha >= %s
+        """,
+        ([meta['id'] for meta in metas], ahora - VENTANA_PROYECCION_DIAS * 86400)
+    )
+    return proyectar_metas(metas, contribuciones, ahora, VENTANA_PROYECCION_DIAS)
+
+
+def listar_metas(db, usuario_id):
+    """Metas del usuario (las más recientes primero) con su progreso"""
+    metas = db.execute(
+        """
+        SELECT id, usuarioId, nombre, descripcion, monto_objetivo, monto_actual,
+               fecha_limite, fecha_creacion
+        FROM metas
+        WHERE usuarioId = %s
+        ORDER BY fecha_creacion DESC
+        """,
+        (usuario_id,)
+    )
+    for meta in metas:
+        # Calcular porcentaje de progreso
+        objetivo = meta['monto_objetivo'].cantidad
+        actual = meta['monto_actual'].cantidad
+        meta['progreso'] = (actual / objetivo * 100) if objetivo > 0 else 0
+        meta['completada'] = actual >= objetivo
+    return metas
+
+
 @metas_bp.route('', methods=['GET'])
 @token_required
+@conditional_get('metas', por_dia=True)
 def get_metas(current_user):
-    """Obtiene todas las metas de ahorro del usuario"""
+    """Obtiene todas las metas de ahorro del usuario
+
+    Con `?proyeccion=true` cada meta incluye su proyección (ver
+    /api/metas/proyecciones).
+    """
     try:
+        proyeccion = request.args.get('proyeccion', 'false').lower() == 'true'
+        
         with Database() as db:
-            metas = db.execute(
-                """
-                SELECT id, usuarioId, nombre, descripcion, monto_objetivo, monto_actual,
-                       fecha_limite, fecha_creacion
-                FROM metas
-                WHERE usuarioId = %s
-                ORDER BY fecha_creacion DESC
-                """,
-                (current_user['user_id'],)
-            )
+            metas = listar_metas(db, current_user['user_id'])
             
-            # Formatear resultados y calcular progreso
-            result = []
-            for meta in metas:
-                meta_dict = dict(meta)
-                meta_dict['monto_objetivo'] = format_monto(meta_dict['monto_objetivo'])
-                meta_dict['monto_actual'] = format_monto(meta_dict['monto_actual'])
-                
-                # Calcular porcentaje de progreso
-                objetivo = meta_dict['monto_objetivo']['cantidad']
-                actual = meta_dict['monto_actual']['cantidad']
-                meta_dict['progreso'] = (actual / objetivo * 100) if objetivo > 0 else 0
-                meta_dict['completada'] = actual >= objetivo
-                
-                result.append(meta_dict)
-            
-            return jsonify(result), 200
+            if proyeccion and metas:
+                for meta, datos in zip(metas, _proyectar(db, metas)):
+                    meta['proyeccion'] = datos
+            
+            return jsonify(metas), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@metas_bp.route('/proyecciones', methods=['GET'])
+@token_required
+@conditional_get('metas', por_dia=True)
+def get_proyecciones(current_user):
+    """Obtiene la proyección de las metas del usuario
+
+    Para cada meta: ritmo de ahorro mensual observado, monto restante,
+    fecha estimada de término, aporte mensual requerido para llegar a la
+    fecha límite y si va en camino de cumplirla. `?ids=1,2` limita las
+    metas consultadas.
+    """
+    try:
+        query = """
+            SELECT id, monto_objetivo, monto_actual, fecha_limite, fecha_creacion
+            FROM metas
+            WHERE usuarioId = %s
+        """
+        params = [current_user['user_id']]
+        
+        ids = request.args.get('ids')
+        if ids:
+            try:
+                params.append([int(meta_id) for meta_id in ids.split(',')])
+            except ValueError:
+                return jsonify({'error': 'ids debe ser una lista de números'}), 400
+            query += " AND id = ANY(%s)"
+        
+        query += " ORDER BY id"
+        
+        with Database() as db:
+            metas = db.execute(query, params)
+            proyecciones = _proyectar(db, metas) if metas else []
+        
+        return jsonify([
+            {'id': meta['id'], **datos} for meta, datos in zip(metas, proyecciones)
+        ]), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @metas_bp.route('', methods=['POST'])
 @token_required
 def create_meta(current_user):
@@ -58,8 +129,8 @@ def create_meta(current_user):
         
         nombre = data['nombre']
         descripcion = data.get('descripcion', '')
-        monto_objetivo = data['monto_objetivo']  # {'cantidad': 50000, 'moneda': 'MXN'}
-        monto_actual = data.get('monto_actual', {'cantidad': 0, 'moneda': 'MXN'})
+        monto_objetivo = Monto.from_json(data['monto_objetivo'])  # {'cantidad': 50000, 'moneda': 'MXN'}
+        monto_actual = Monto.from_json(data.get('monto_actual', {'cantidad': 0, 'moneda': 'MXN'}))
         fecha_limite = data.get('fecha_limite')
         
         with Database() as db:
@@ -68,11 +139,9 @@ def create_meta(current_user):
                 """
                 INSERT INTO metas (usuarioId, nombre, descripcion, monto_objetivo, monto_actual,
                                    fecha_limite, fecha_creacion)
-                VALUES (%s, %s, %s, ROW(%s, %s)::monto, ROW(%s, %s)::monto, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """,
-                (current_user['user_id'], nombre, descripcion,
-                 monto_objetivo['cantidad'], monto_objetivo.get('moneda', 'MXN'),
-                 monto_actual['cantidad'], monto_actual.get('moneda', 'MXN'),
+                (current_user['user_id'], nombre, descripcion, monto_objetivo, monto_actual,
                  fecha_limite, int(time.time()))
             )
             
@@ -115,9 +184,8 @@ def update_meta(current_user, meta_id):
                 params.append(data['descripcion'])
             
             if 'monto_objetivo' in data:
-                monto = data['monto_objetivo']
-                updates.append("monto_objetivo = ROW(%s, %s)::monto")
-                params.extend([monto['cantidad'], monto.get('moneda', 'MXN')])
+                updates.append("monto_objetivo = %s")
+                params.append(Monto.from_json(data['monto_objetivo']))
             
             if 'fecha_limite' in data:
                 updates.append("fecha_limite = %s")
@@ -152,41 +220,102 @@ def contribuir_meta(current_user, meta_id):
         if 'cantidad' not in data:
             return jsonify({'error': 'Cantidad requerida'}), 400
         
-        cantidad = data['cantidad']
+        try:
+            cantidad = float(data['cantidad'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'La cantidad debe ser numérica'}), 400
+        
+        if not math.isfinite(cantidad) or cantidad <= 0:
+            return jsonify({'error': 'La cantidad debe ser mayor a 0'}), 400
         
         with Database() as db:
-            # Verificar que la meta pertenece al usuario y obtener monto actual
-            meta = db.execute_one(
-                "SELECT id, monto_actual FROM metas WHERE id = %s AND usuarioId = %s",
-                (meta_id, current_user['user_id'])
-            )
-            
-            if not meta:
-                return jsonify({'error': 'Meta no encontrada'}), 404
-            
-            # Obtener monto actual
-            monto_actual = format_monto(meta['monto_actual'])
-            nuevo_monto = monto_actual['cantidad'] + cantidad
-            
-            # Actualizar monto actual
-            db.execute_update(
+            # Registrar la contribución y sumarla a monto_actual en una sola
+            # sentencia atómica (el UPDATE bloquea la fila de la meta)
+            resultado = db.execute_one(
                 """
-                UPDATE metas
-                SET monto_actual = ROW(%s, %s)::monto
-                WHERE id = %s AND usuarioId = %s
+                WITH meta AS (
+                    UPDATE metas
+                    SET monto_actual = ROW((monto_actual).cantidad + %s, (monto_actual).moneda)::monto
+                    WHERE id = %s AND usuarioId = %s
+                    RETURNING id, monto_actual
+                ), contribucion AS (
+                    INSERT INTO meta_contribuciones (metaId, usuarioId, cantidad, fecha)
+                    SELECT id, %s, %s, %s FROM meta
+                    RETURNING id
+                )
+                SELECT meta.monto_actual, contribucion.id AS contribucion_id
+                FROM meta, contribucion
                 """,
-                (nuevo_monto, monto_actual['moneda'], meta_id, current_user['user_id'])
+                (cantidad, meta_id, current_user['user_id'],
+                 current_user['user_id'], cantidad, int(time.time()))
             )
             
+            if not resultado:
+                return jsonify({'error': 'Meta no encontrada'}), 404
+            
             return jsonify({
                 'message': 'Contribución añadida exitosamente',
-                'nuevo_monto': nuevo_monto
+                'nuevo_monto': resultado['monto_actual'].cantidad,
+                'contribucion_id': resultado['contribucion_id']
             }), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@metas_bp.route('/<int:meta_id>/contribuciones', methods=['GET'])
+@token_required
+@conditional_get('metas')
+def get_contribuciones(current_user, meta_id):
+    """Obtiene el historial de contribuciones de una meta (paginado por cursor)"""
+    try:
+        limit = page_size(request.args.get('limit', type=int))
+        cursor = request.args.get('cursor')
+        
+        query = """
+            SELECT id, metaId, cantidad, fecha
+            FROM meta_contribuciones
+            WHERE metaId = %s AND usuarioId = %s
+        """
+        params = [meta_id, current_user['user_id']]
+        
+        if cursor:
+            try:
+                cursor_fecha, cursor_id = decode_cursor(cursor, 2)
+                params.extend([int(cursor_fecha), int(cursor_id)])
+            except (InvalidCursor, TypeError, ValueError):
+                return jsonify({'error': 'Cursor inválido'}), 400
+            query += " AND (fecha, id) < (%s, %s)"
+        
+        query += " ORDER BY fecha DESC, id DESC LIMIT %s"
+        # Se pide una fila extra para saber si existe una página siguiente
+        params.append(limit + 1)
+        
+        with Database() as db:
+            contribuciones = db.execute(query, params)
+            
+            # Sin resultados: distinguir meta sin contribuciones de meta ajena
+            if not contribuciones and not cursor:
+                meta = db.execute_one(
+                    "SELECT id FROM metas WHERE id = %s AND usuarioId = %s",
+                    (meta_id, current_user['user_id'])
+                )
+                if not meta:
+                    return jsonify({'error': 'Meta no encontrada'}), 404
+        
+        result = contribuciones[:limit]
+        
+        next_cursor = None
+        if len(contribuciones) > limit:
+            ultimo = result[-1]
+            next_cursor = encode_cursor(ultimo['fecha'], ultimo['id'])
+        
+        return jsonify({'items': result, 'next_cursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @metas_bp.route('/<int:meta_id>', methods=['DELETE'])
 @token_required
 def delete_meta(current_user, meta_id):
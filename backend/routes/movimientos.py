@@ -1,109 +1,372 @@
 from flask import Blueprint, request, jsonify
-from database import Database, format_monto
+from database import Database, Monto
 from middleware import token_required
+from conditional import conditional_get
+from cache import buscar_categorias, get_categoria_usuario
+from streaming import stream_json_list, stream_copy
+from pagination import encode_cursor, decode_cursor, page_size, InvalidCursor
 import time
+import csv
+import io
 
 movimientos_bp = Blueprint('movimientos', __name__)
 
+def _select_movimientos(tabla, columna):
+    """SELECT de gastos o ingresos de un usuario con los datos de su categoría"""
+    return f"""
+        SELECT m.id, m.usuarioId, m.categoriaId, m.monto, m.metodo_pago,
+               m.{columna}, m.descripcion, m.fecha,
+               c.nombre as categoria_nombre, c.tipo as categoria_tipo
+        FROM {tabla} m
+        JOIN categorias c ON m.categoriaId = c.id
+        WHERE m.usuarioId = %s
+    """
+
+def movimientos_recientes(db, usuario_id, tabla, columna, limit):
+    """Últimos `limit` gastos o ingresos del usuario, en el orden del listado"""
+    return db.execute(
+        _select_movimientos(tabla, columna) + " ORDER BY m.fecha DESC, m.id DESC LIMIT %s",
+        (usuario_id, limit)
+    )
+
+def resumen_usuario(db, usuario_id):
+    """Total de ingresos, de gastos y balance del usuario"""
+    balance = db.execute_one(
+        "SELECT * FROM vista_balance_usuarios WHERE usuario_id = %s",
+        (usuario_id,)
+    )
+    if not balance:
+        return {
+            'total_ingresos': 0,
+            'total_gastos': 0,
+            'balance': 0
+        }
+    return dict(balance)
+
+def _listar_movimientos(current_user, tabla, columna):
+    """Lista gastos o ingresos del usuario con filtros y paginación por cursor
+
+    Si se envía el parámetro `cursor` (vacío para la primera página) la
+    respuesta es `{'items': [...], 'next_cursor': ...}` y las páginas se
+    obtienen por clave (fecha, id), con el mismo costo sin importar la
+    profundidad. Sin `cursor` se conserva la respuesta original (lista).
+    """
+    # Parámetros de filtro opcionales
+    categoria_id = request.args.get('categoriaId', type=int)
+    fecha_inicio = request.args.get('fechaInicio', type=int)
+    fecha_fin = request.args.get('fechaFin', type=int)
+    limit = request.args.get('limit', type=int, default=100)
+    cursor = request.args.get('cursor')
+    paginado = cursor is not None
+
+    query = _select_movimientos(tabla, columna)
+    params = [current_user['user_id']]
+
+    if categoria_id:
+        query += " AND m.categoriaId = %s"
+        params.append(categoria_id)
+
+    if fecha_inicio:
+        query += " AND m.fecha >= %s"
+        params.append(fecha_inicio)
+
+    if fecha_fin:
+        query += " AND m.fecha <= %s"
+        params.append(fecha_fin)
+
+    if paginado:
+        limit = page_size(limit)
+        if cursor:
+            try:
+                cursor_fecha, cursor_id = decode_cursor(cursor, 2)
+                params.extend([int(cursor_fecha), int(cursor_fecha), int(cursor_id)])
+            except (InvalidCursor, TypeError, ValueError):
+                return jsonify({'error': 'Cursor inválido'}), 400
+            # La condición sobre fecha sola permite descartar particiones
+            query += " AND m.fecha <= %s AND (m.fecha, m.id) < (%s, %s)"
+
+    query += " ORDER BY m.fecha DESC, m.id DESC LIMIT %s"
+
+    if not paginado:
+        # Sin cursor el resultado puede ser muy grande: se serializa en streaming
+        params.append(limit)
+        return stream_json_list(query, params)
+
+    # Se pide una fila extra para saber si existe una página siguiente
+    params.append(limit + 1)
+
+    with Database() as db:
+        movimientos = db.execute(query, params)
+
+    result = movimientos[:limit]
+
+    next_cursor = None
+    if len(movimientos) > limit:
+        ultimo = result[-1]
+        next_cursor = encode_cursor(ultimo['fecha'], ultimo['id'])
+
+    return jsonify({'items': result, 'next_cursor': next_cursor}), 200
+
+
 @movimientos_bp.route('/gastos', methods=['GET'])
 @token_required
+@conditional_get('gastos', 'categorias')
 def get_gastos(current_user):
     """Obtiene todos los gastos del usuario"""
     try:
-        # Parámetros de filtro opcionales
-        categoria_id = request.args.get('categoriaId', type=int)
-        fecha_inicio = request.args.get('fechaInicio', type=int)
-        fecha_fin = request.args.get('fechaFin', type=int)
-        limit = request.args.get('limit', type=int, default=100)
-        
-        with Database() as db:
-            query = """
-                SELECT g.id, g.usuarioId, g.categoriaId, g.monto, g.metodo_pago,
-                       g.detalle, g.descripcion, g.fecha,
-                       c.nombre as categoria_nombre, c.tipo as categoria_tipo
-                FROM gastos g
-                JOIN categorias c ON g.categoriaId = c.id
-                WHERE g.usuarioId = %s
-            """
-            params = [current_user['user_id']]
-            
-            if categoria_id:
-                query += " AND g.categoriaId = %s"
-                params.append(categoria_id)
-            
-            if fecha_inicio:
-                query += " AND g.fecha >= %s"
-                params.append(fecha_inicio)
-            
-            if fecha_fin:
-                query += " AND g.fecha <= %s"
-                params.append(fecha_fin)
-            
-            query += " ORDER BY g.fecha DESC LIMIT %s"
-            params.append(limit)
-            
-            gastos = db.execute(query, params)
-            
-            # Formatear resultados
-            result = []
-            for gasto in gastos:
-                gasto_dict = dict(gasto)
-                gasto_dict['monto'] = format_monto(gasto_dict['monto'])
-                result.append(gasto_dict)
-            
-            return jsonify(result), 200
-            
+        return _listar_movimientos(current_user, 'gastos', 'detalle')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @movimientos_bp.route('/ingresos', methods=['GET'])
 @token_required
+@conditional_get('ingresos', 'categorias')
 def get_ingresos(current_user):
     """Obtiene todos los ingresos del usuario"""
     try:
-        # Parámetros de filtro opcionales
+        return _listar_movimientos(current_user, 'ingresos', 'fuente')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@movimientos_bp.route('/export', methods=['GET'])
+@token_required
+def export_movimientos(current_user):
+    """Exporta todos los movimientos del usuario en CSV o NDJSON
+
+    Los datos se envían directamente desde `COPY ... TO STDOUT`, sin
+    cargarlos en memoria. Filtros opcionales: tipo, categoriaId,
+    fechaInicio y fechaFin.
+    """
+    try:
+        formato = request.args.get('format', 'csv')
+        tipo = request.args.get('tipo')  # 'gasto' o 'ingreso'
         categoria_id = request.args.get('categoriaId', type=int)
         fecha_inicio = request.args.get('fechaInicio', type=int)
         fecha_fin = request.args.get('fechaFin', type=int)
-        limit = request.args.get('limit', type=int, default=100)
         
-        with Database() as db:
-            query = """
-                SELECT i.id, i.usuarioId, i.categoriaId, i.monto, i.metodo_pago,
-                       i.fuente, i.descripcion, i.fecha,
-                       c.nombre as categoria_nombre, c.tipo as categoria_tipo
-                FROM ingresos i
-                JOIN categorias c ON i.categoriaId = c.id
-                WHERE i.usuarioId = %s
+        if formato not in ['csv', 'ndjson']:
+            return jsonify({'error': 'Formato debe ser "csv" o "ndjson"'}), 400
+        
+        if tipo and tipo not in ['gasto', 'ingreso']:
+            return jsonify({'error': 'Tipo debe ser "gasto" o "ingreso"'}), 400
+        
+        filtros = ""
+        filtro_params = []
+        
+        if categoria_id:
+            filtros += " AND m.categoriaId = %s"
+            filtro_params.append(categoria_id)
+        
+        if fecha_inicio:
+            filtros += " AND m.fecha >= %s"
+            filtro_params.append(fecha_inicio)
+        
+        if fecha_fin:
+            filtros += " AND m.fecha <= %s"
+            filtro_params.append(fecha_fin)
+        
+        selects = []
+        params = []
+        for tipo_mov, tabla, detalle, fuente in [
+            ('gasto', 'gastos', 'm.detalle', 'NULL'),
+            ('ingreso', 'ingresos', 'NULL', 'm.fuente'),
+        ]:
+            if tipo and tipo != tipo_mov:
+                continue
+            selects.append(f"""
+                SELECT '{tipo_mov}' AS tipo, m.id, m.categoriaId AS "categoriaId",
+                       c.nombre AS categoria_nombre,
+                       (m.monto).cantidad AS cantidad, (m.monto).moneda AS moneda,
+                       m.metodo_pago, {detalle} AS detalle, {fuente} AS fuente,
+                       m.descripcion, m.fecha
+                FROM {tabla} m
+                JOIN categorias c ON m.categoriaId = c.id
+                WHERE m.usuarioId = %s{filtros}
+            """)
+            params.append(current_user['user_id'])
+            params.extend(filtro_params)
+        
+        query = " UNION ALL ".join(selects) + " ORDER BY fecha, id"
+        
+        if formato == 'csv':
+            copy = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+            mimetype = 'text/csv'
+        else:
+            # En formato csv con comillas y delimitador que nunca aparecen en
+            # el JSON generado, COPY entrega cada objeto sin escaparlo
+            copy = f"""
+                COPY (SELECT row_to_json(e)::text FROM ({query}) e)
+                TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')
             """
-            params = [current_user['user_id']]
-            
-            if categoria_id:
-                query += " AND i.categoriaId = %s"
-                params.append(categoria_id)
-            
-            if fecha_inicio:
-                query += " AND i.fecha >= %s"
-                params.append(fecha_inicio)
-            
-            if fecha_fin:
-                query += " AND i.fecha <= %s"
-                params.append(fecha_fin)
-            
-            query += " ORDER BY i.fecha DESC LIMIT %s"
-            params.append(limit)
-            
-            ingresos = db.execute(query, params)
-            
-            # Formatear resultados
-            result = []
-            for ingreso in ingresos:
-                ingreso_dict = dict(ingreso)
-                ingreso_dict['monto'] = format_monto(ingreso_dict['monto'])
-                result.append(ingreso_dict)
+            mimetype = 'application/x-ndjson'
+        
+        return stream_copy(copy, params, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=movimientos.{formato}'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Número máximo de movimientos aceptados por importación
+MAX_IMPORT_ROWS = 10000
+
+
+def _leer_filas_importacion():
+    """Obtiene las filas a importar desde un JSON o un archivo CSV"""
+    archivo = request.files.get('archivo')
+    if archivo:
+        texto = archivo.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        texto = request.get_data(as_text=True)
+    else:
+        data = request.get_json()
+        if isinstance(data, dict):
+            data = data.get('movimientos')
+        if not isinstance(data, list):
+            raise ValueError('Se esperaba una lista de movimientos')
+        return data
+    
+    filas = []
+    for fila in csv.DictReader(io.StringIO(texto)):
+        fila['monto'] = {
+            'cantidad': fila.pop('cantidad', None),
+            'moneda': fila.pop('moneda', None) or 'MXN'
+        }
+        filas.append(fila)
+    return filas
+
+
+def _validar_fila_importacion(fila, ahora):
+    """Valida una fila y la normaliza; lanza ValueError si es inválida"""
+    if not isinstance(fila, dict):
+        raise ValueError('La fila debe ser un objeto')
+    
+    for field in ['categoriaId', 'monto', 'metodo_pago']:
+        if fila.get(field) in (None, ''):
+            raise ValueError(f'Campo requerido: {field}')
+    
+    monto = fila['monto']
+    if not isinstance(monto, dict) or monto.get('cantidad') in (None, ''):
+        raise ValueError('Campo requerido: monto.cantidad')
+    
+    try:
+        categoria_id = int(fila['categoriaId'])
+        cantidad = float(monto['cantidad'])
+        fecha = int(fila['fecha']) if fila.get('fecha') not in (None, '') else ahora
+    except (TypeError, ValueError):
+        raise ValueError('categoriaId, monto.cantidad y fecha deben ser numéricos')
+    
+    return {
+        'tipo': fila.get('tipo') or None,
+        'categoriaId': categoria_id,
+        'monto': Monto(cantidad, monto.get('moneda')),
+        'metodo_pago': fila['metodo_pago'],
+        'detalle': fila.get('detalle') or 'Gasto',
+        'fuente': fila.get('fuente') or 'Ingreso',
+        'descripcion': fila.get('descripcion') or '',
+        'fecha': fecha
+    }
+
+
+@movimientos_bp.route('/import', methods=['POST'])
+@token_required
+def import_movimientos(current_user):
+    """Importa gastos e ingresos en bloque desde JSON o CSV
+
+    El tipo de cada movimiento se toma de su categoría. Todas las
+    categorías se validan en una sola consulta y las filas se insertan con
+    INSERT multi-fila en una única transacción. Si alguna fila es inválida
+    no se inserta nada, salvo que se envíe `?parcial=true`.
+    """
+    try:
+        parcial = request.args.get('parcial', 'false').lower() == 'true'
+        
+        try:
+            filas = _leer_filas_importacion()
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not filas:
+            return jsonify({'error': 'No hay movimientos para importar'}), 400
+        
+        if len(filas) > MAX_IMPORT_ROWS:
+            return jsonify({
+                'error': f'Máximo {MAX_IMPORT_ROWS} movimientos por importación'
+            }), 400
+        
+        ahora = int(time.time())
+        errores = []
+        validas = []
+        for numero, fila in enumerate(filas, start=1):
+            try:
+                validas.append((numero, _validar_fila_importacion(fila, ahora)))
+            except ValueError as e:
+                errores.append({'fila': numero, 'error': str(e)})
+        
+        # Validar todas las categorías con la caché (a lo más una consulta);
+        # la llave foránea rechaza las que se eliminen mientras tanto
+        categoria_ids = list({fila['categoriaId'] for _, fila in validas})
+        categorias = {
+            cid: cat['tipo'] for cid, cat in
+            buscar_categorias(current_user['user_id'], categoria_ids).items()
+        }
+        
+        with Database() as db:
+            gastos = []
+            ingresos = []
+            for numero, fila in validas:
+                tipo = categorias.get(fila['categoriaId'])
+                if not tipo:
+                    errores.append({'fila': numero, 'error': 'Categoría no encontrada'})
+                    continue
+                if fila['tipo'] and fila['tipo'] != tipo:
+                    errores.append({
+                        'fila': numero,
+                        'error': f'La categoría debe ser de tipo {fila["tipo"]}'
+                    })
+                    continue
+                
+                valores = (current_user['user_id'], fila['categoriaId'], fila['monto'],
+                           fila['metodo_pago'],
+                           fila['detalle'] if tipo == 'gasto' else fila['fuente'],
+                           fila['descripcion'], fila['fecha'])
+                (gastos if tipo == 'gasto' else ingresos).append(valores)
+            
+            errores.sort(key=lambda error: error['fila'])
+            if errores and not parcial:
+                return jsonify({
+                    'error': 'Hay filas inválidas, no se importó ningún movimiento',
+                    'errores': errores
+                }), 400
+            
+            gasto_ids = []
+            ingreso_ids = []
+            if gastos:
+                gasto_ids = db.execute_values(
+                    """
+                    INSERT INTO gastos (usuarioId, categoriaId, monto, metodo_pago, detalle, descripcion, fecha)
+                    VALUES %s
+                    """,
+                    gastos
+                )
+            if ingresos:
+                ingreso_ids = db.execute_values(
+                    """
+                    INSERT INTO ingresos (usuarioId, categoriaId, monto, metodo_pago, fuente, descripcion, fecha)
+                    VALUES %s
+                    """,
+                    ingresos
+                )
             
-            return jsonify(result), 200
+            return jsonify({
+                'message': 'Movimientos importados exitosamente',
+                'gastos': len(gasto_ids),
+                'ingresos': len(ingreso_ids),
+                'errores': errores
+            }), 201
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -123,34 +386,47 @@ def create_gasto(current_user):
                 return jsonify({'error': f'Campo requerido: {field}'}), 400
         
         categoria_id = data['categoriaId']
-        monto = data['monto']  # {'cantidad': 100, 'moneda': 'MXN'}
+        monto = Monto.from_json(data['monto'])  # {'cantidad': 100, 'moneda': 'MXN'}
         metodo_pago = data['metodo_pago']
         detalle = data.get('detalle', 'Gasto')
         descripcion = data.get('descripcion', '')
         fecha = data.get('fecha', int(time.time()))
         
+        # Validación previa con la caché de categorías, sin ir a la base de datos
+        categoria = get_categoria_usuario(current_user['user_id'], categoria_id)
+        if not categoria:
+            return jsonify({'error': 'Categoría no encontrada'}), 404
+        if categoria['tipo'] != 'gasto':
+            return jsonify({'error': 'La categoría debe ser de tipo gasto'}), 400
+        
         with Database() as db:
-            # Verificar que la categoría existe y pertenece al usuario
-            categoria = db.execute_one(
-                "SELECT id, tipo FROM categorias WHERE id = %s AND usuarioId = %s",
-                (categoria_id, current_user['user_id'])
+            # Insertar gasto verificando la categoría en la misma sentencia
+            # (pudo eliminarse después de cargarse en la caché)
+            resultado = db.execute_one(
+                """
+                WITH categoria AS (
+                    SELECT id, tipo FROM categorias WHERE id = %s AND usuarioId = %s
+                ), nuevo AS (
+                    INSERT INTO gastos (usuarioId, categoriaId, monto, metodo_pago, detalle, descripcion, fecha)
+                    SELECT %s, id, %s, %s, %s, %s, %s
+                    FROM categoria
+                    WHERE tipo = 'gasto'
+                    RETURNING id
+                )
+                SELECT (SELECT tipo FROM categoria) AS categoria_tipo,
+                       (SELECT id FROM nuevo) AS id
+                """,
+                (categoria_id, current_user['user_id'],
+                 current_user['user_id'], monto, metodo_pago, detalle, descripcion, fecha)
             )
             
-            if not categoria:
+            if not resultado['categoria_tipo']:
                 return jsonify({'error': 'Categoría no encontrada'}), 404
             
-            if categoria['tipo'] != 'gasto':
+            if resultado['categoria_tipo'] != 'gasto':
                 return jsonify({'error': 'La categoría debe ser de tipo gasto'}), 400
             
-            # Insertar gasto
-            gasto_id = db.execute_insert(
-                """
-                INSERT INTO gastos (usuarioId, categoriaId, monto, metodo_pago, detalle, descripcion, fecha)
-                VALUES (%s, %s, ROW(%s, %s)::monto, %s, %s, %s, %s)
-                """,
-                (current_user['user_id'], categoria_id, monto['cantidad'], monto.get('moneda', 'MXN'),
-                 metodo_pago, detalle, descripcion, fecha)
-            )
+            gasto_id = resultado['id']
             
             return jsonify({
                 'message': 'Gasto creado exitosamente',
@@ -175,34 +451,47 @@ def create_ingreso(current_user):
                 return jsonify({'error': f'Campo requerido: {field}'}), 400
         
         categoria_id = data['categoriaId']
-        monto = data['monto']
+        monto = Monto.from_json(data['monto'])
         metodo_pago = data['metodo_pago']
         fuente = data.get('fuente', 'Ingreso')
         descripcion = data.get('descripcion', '')
         fecha = data.get('fecha', int(time.time()))
         
+        # Validación previa con la caché de categorías, sin ir a la base de datos
+        categoria = get_categoria_usuario(current_user['user_id'], categoria_id)
+        if not categoria:
+            return jsonify({'error': 'Categoría no encontrada'}), 404
+        if categoria['tipo'] != 'ingreso':
+            return jsonify({'error': 'La categoría debe ser de tipo ingreso'}), 400
+        
         with Database() as db:
-            # Verificar que la categoría existe y pertenece al usuario
-            categoria = db.execute_one(
-                "SELECT id, tipo FROM categorias WHERE id = %s AND usuarioId = %s",
-                (categoria_id, current_user['user_id'])
+            # Insertar ingreso verificando la categoría en la misma sentencia
+            # (pudo eliminarse después de cargarse en la caché)
+            resultado = db.execute_one(
+                """
+                WITH categoria AS (
+                    SELECT id, tipo FROM categorias WHERE id = %s AND usuarioId = %s
+                ), nuevo AS (
+                    INSERT INTO ingresos (usuarioId, categoriaId, monto, metodo_pago, fuente, descripcion, fecha)
+                    SELECT %s, id, %s, %s, %s, %s, %s
+                    FROM categoria
+                    WHERE tipo = 'ingreso'
+                    RETURNING id
+                )
+                SELECT (SELECT tipo FROM categoria) AS categoria_tipo,
+                       (SELECT id FROM nuevo) AS id
+                """,
+                (categoria_id, current_user['user_id'],
+                 current_user['user_id'], monto, metodo_pago, fuente, descripcion, fecha)
             )
             
-            if not categoria:
+            if not resultado['categoria_tipo']:
                 return jsonify({'error': 'Categoría no encontrada'}), 404
             
-            if categoria['tipo'] != 'ingreso':
+            if resultado['categoria_tipo'] != 'ingreso':
                 return jsonify({'error': 'La categoría debe ser de tipo ingreso'}), 400
             
-            # Insertar ingreso
-            ingreso_id = db.execute_insert(
-                """
-                INSERT INTO ingresos (usuarioId, categoriaId, monto, metodo_pago, fuente, descripcion, fecha)
-                VALUES (%s, %s, ROW(%s, %s)::monto, %s, %s, %s, %s)
-                """,
-                (current_user['user_id'], categoria_id, monto['cantidad'], monto.get('moneda', 'MXN'),
-                 metodo_pago, fuente, descripcion, fecha)
-            )
+            ingreso_id = resultado['id']
             
             return jsonify({
                 'message': 'Ingreso creado exitosamente',
@@ -255,24 +544,188 @@ def delete_ingreso(current_user, ingreso_id):
 
 @movimientos_bp.route('/resumen', methods=['GET'])
 @token_required
+@conditional_get('gastos', 'ingresos')
 def get_resumen(current_user):
     """Obtiene un resumen de ingresos y gastos"""
     try:
         with Database() as db:
-            # Obtener balance del usuario
-            balance = db.execute_one(
-                "SELECT * FROM vista_balance_usuarios WHERE usuario_id = %s",
-                (current_user['user_id'],)
-            )
-            
-            if not balance:
-                return jsonify({
-                    'total_ingresos': 0,
-                    'total_gastos': 0,
-                    'balance': 0
-                }), 200
-            
-            return jsonify(dict(balance)), 200
+            return jsonify(resumen_usuario(db, current_user['user_id'])), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+# Primer día (días UTC desde epoch) del periodo al que pertenece cada cubeta
+_INICIO_PERIODO = {
+    'dia': "d.dia",
+    'semana': "(date_trunc('week', (DATE '1970-01-01' + d.dia)::TIMESTAMP)::DATE - DATE '1970-01-01')",
+    'mes': "(date_trunc('month', (DATE '1970-01-01' + d.dia)::TIMESTAMP)::DATE - DATE '1970-01-01')"
+}
+
+# Columnas adicionales de agrupación
+_AGRUPAR_POR = {
+    'categoria': ['d.categoriaId', 'c.nombre AS categoria_nombre'],
+    'metodo_pago': ['d.metodo_pago']
+}
+
+
+@movimientos_bp.route('/analytics', methods=['GET'])
+@token_required
+@conditional_get('gastos', 'ingresos', 'categorias')
+def get_analytics(current_user):
+    """Obtiene gastos e ingresos agregados por día, semana o mes
+
+    Se lee de las cubetas diarias de movimientos_diarios. Parámetros:
+    `periodo` (dia, semana o mes), `por` (categoria o metodo_pago),
+    `tipo`, `categoriaId`, `fechaInicio` y `fechaFin` (se redondean al
+    día UTC). `inicio` de cada fila es el primer segundo del periodo.
+    """
+    try:
+        periodo = request.args.get('periodo', 'mes')
+        por = request.args.get('por')
+        tipo = request.args.get('tipo')
+        categoria_id = request.args.get('categoriaId', type=int)
+        fecha_inicio = request.args.get('fechaInicio', type=int)
+        fecha_fin = request.args.get('fechaFin', type=int)
+        
+        if periodo not in _INICIO_PERIODO:
+            return jsonify({'error': 'Periodo debe ser dia, semana o mes'}), 400
+        
+        if por and por not in _AGRUPAR_POR:
+            return jsonify({'error': 'Solo se puede agrupar por categoria o metodo_pago'}), 400
+        
+        if tipo and tipo not in ['gasto', 'ingreso']:
+            return jsonify({'error': 'Tipo debe ser "gasto" o "ingreso"'}), 400
+        
+        columnas = _AGRUPAR_POR.get(por, [])
+        agrupar = ['1', 'd.tipo'] + [columna.split(' AS ')[0] for columna in columnas]
+        seleccion = [
+            f"{_INICIO_PERIODO[periodo]}::BIGINT * 86400 AS inicio",
+            'd.tipo',
+            *columnas,
+            'SUM(d.total)::DOUBLE PRECISION AS total',
+            'SUM(d.num)::BIGINT AS num'
+        ]
+        
+        query = f"SELECT {', '.join(seleccion)} FROM movimientos_diarios d"
+        if por == 'categoria':
+            query += " JOIN categorias c ON c.id = d.categoriaId"
+        
+        query += " WHERE d.usuarioId = %s"
+        params = [current_user['user_id']]
+        
+        if tipo:
+            query += " AND d.tipo = %s"
+            params.append(tipo)
+        
+        if categoria_id:
+            query += " AND d.categoriaId = %s"
+            params.append(categoria_id)
+        
+        if fecha_inicio:
+            query += " AND d.dia >= dia_epoch(%s)"
+            params.append(fecha_inicio)
+        
+        if fecha_fin:
+            query += " AND d.dia <= dia_epoch(%s)"
+            params.append(fecha_fin)
+        
+        query += f" GROUP BY {', '.join(agrupar)} ORDER BY {', '.join(agrupar)}"
+        
+        with Database() as db:
+            series = db.execute(query, params)
+        
+        return jsonify({
+            'periodo': periodo,
+            'por': por,
+            'series': series
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@movimientos_bp.route('/search', methods=['GET'])
+@token_required
+@conditional_get('gastos', 'ingresos', 'categorias')
+def search_movimientos(current_user):
+    """Busca gastos e ingresos por detalle, fuente y descripción
+
+    Combina búsqueda de texto completo en español (`q` admite la sintaxis
+    de websearch: frases entre comillas, -excluir, or) con coincidencias
+    por trigramas, que toleran errores de escritura y palabras
+    incompletas. Las coincidencias de texto completo van primero; el
+    resultado se pagina por cursor: `{'items': [...], 'next_cursor': ...}`.
+    Filtros opcionales: tipo, limit y cursor.
+    """
+    try:
+        texto = (request.args.get('q') or '').strip()
+        tipo = request.args.get('tipo')  # 'gasto' o 'ingreso'
+        limit = page_size(request.args.get('limit', type=int), default=50)
+        cursor = request.args.get('cursor')
+        
+        if len(texto) < 2:
+            return jsonify({'error': 'La búsqueda requiere al menos 2 caracteres'}), 400
+        
+        if tipo and tipo not in ['gasto', 'ingreso']:
+            return jsonify({'error': 'Tipo debe ser "gasto" o "ingreso"'}), 400
+        
+        params = [texto, texto]
+        selects = []
+        for tipo_mov, tabla, detalle, fuente in [
+            ('gasto', 'gastos', 'm.detalle', 'NULL'),
+            ('ingreso', 'ingresos', 'NULL', 'm.fuente'),
+        ]:
+            if tipo and tipo != tipo_mov:
+                continue
+            # Texto completo: 1 + ts_rank normalizado (< 1); trigramas: 0 a 1
+            selects.append(f"""
+                SELECT '{tipo_mov}' AS tipo, m.id, m.usuarioId, m.categoriaId, m.monto,
+                       m.metodo_pago, {detalle} AS detalle, {fuente} AS fuente,
+                       m.descripcion, m.fecha,
+                       c.nombre AS categoria_nombre,
+                       (CASE WHEN m.busqueda @@ q.consulta
+                             THEN 1 + ts_rank(m.busqueda, q.consulta, 32)
+                             ELSE 0 END
+                        + word_similarity(q.texto, m.busqueda_texto))::DOUBLE PRECISION AS relevancia
+                FROM {tabla} m
+                JOIN categorias c ON m.categoriaId = c.id
+                CROSS JOIN q
+                WHERE m.usuarioId = %s
+                  AND (m.busqueda @@ q.consulta OR q.texto <%% m.busqueda_texto)
+            """)
+            params.append(current_user['user_id'])
+        
+        query = f"""
+            WITH q AS (
+                SELECT websearch_to_tsquery('spanish', %s) AS consulta, %s::TEXT AS texto
+            )
+            SELECT * FROM ({" UNION ALL ".join(selects)}) r
+        """
+        
+        if cursor:
+            try:
+                cursor_relevancia, cursor_fecha, cursor_id = decode_cursor(cursor, 3)
+                params.extend([float(cursor_relevancia), int(cursor_fecha), int(cursor_id)])
+            except (InvalidCursor, TypeError, ValueError):
+                return jsonify({'error': 'Cursor inválido'}), 400
+            query += " WHERE (r.relevancia, r.fecha, r.id) < (%s, %s, %s)"
+        
+        # Se pide una fila extra para saber si existe una página siguiente
+        query += " ORDER BY r.relevancia DESC, r.fecha DESC, r.id DESC LIMIT %s"
+        params.append(limit + 1)
+        
+        with Database() as db:
+            movimientos = db.execute(query, params)
+        
+        result = movimientos[:limit]
+        
+        next_cursor = None
+        if len(movimientos) > limit:
+            ultimo = result[-1]
+            next_cursor = encode_cursor(ultimo['relevancia'], ultimo['fecha'], ultimo['id'])
+        
+        return jsonify({'items': result, 'next_cursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
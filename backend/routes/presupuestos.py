@@ -1,12 +1,23 @@
 from flask import Blueprint, request, jsonify
-from database import Database, format_monto
+from database import Database, Monto
 from middleware import token_required
+from conditional import conditional_get
+from cache import get_categoria_usuario
+from proyecciones import pronosticar_presupuestos
 import time
 
 presupuestos_bp = Blueprint('presupuestos', __name__)
 
+def estados_presupuestos(db, usuario_id):
+    """Estado (gastado vs límite) de todos los presupuestos del usuario"""
+    return db.execute(
+        "SELECT * FROM vista_estado_presupuestos WHERE usuarioId = %s ORDER BY id",
+        (usuario_id,)
+    )
+
 @presupuestos_bp.route('', methods=['GET'])
 @token_required
+@conditional_get('presupuestos', 'categorias')
 def get_presupuestos(current_user):
     """Obtiene todos los presupuestos del usuario"""
     try:
@@ -23,14 +34,7 @@ def get_presupuestos(current_user):
                 (current_user['user_id'],)
             )
             
-            # Formatear resultados
-            result = []
-            for presupuesto in presupuestos:
-                p_dict = dict(presupuesto)
-                p_dict['monto_max'] = format_monto(p_dict['monto_max'])
-                result.append(p_dict)
-            
-            return jsonify(result), 200
+            return jsonify(presupuestos), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -50,46 +54,47 @@ def create_presupuesto(current_user):
                 return jsonify({'error': f'Campo requerido: {field}'}), 400
         
         categoria_id = data['categoriaId']
-        monto_max = data['monto_max']  # {'cantidad': 5000, 'moneda': 'MXN'}
+        monto_max = Monto.from_json(data['monto_max'])  # {'cantidad': 5000, 'moneda': 'MXN'}
         periodo = data['periodo']  # 'mensual', 'semanal', 'anual'
         
         # Validar periodo
         if periodo not in ['mensual', 'semanal', 'anual']:
             return jsonify({'error': 'Periodo debe ser mensual, semanal o anual'}), 400
         
+        # Validación previa con la caché de categorías
+        if not get_categoria_usuario(current_user['user_id'], categoria_id):
+            return jsonify({'error': 'Categoría no encontrada'}), 404
+        
         with Database() as db:
-            # Verificar que la categoría existe y pertenece al usuario
-            categoria = db.execute_one(
-                "SELECT id FROM categorias WHERE id = %s AND usuarioId = %s",
-                (categoria_id, current_user['user_id'])
-            )
-            
-            if not categoria:
-                return jsonify({'error': 'Categoría no encontrada'}), 404
-            
-            # Verificar si ya existe un presupuesto para esta categoría y periodo
-            existing = db.execute_one(
+            # Verificar la categoría e insertar en una sola sentencia; el
+            # índice único (usuarioId, categoriaId, periodo) evita duplicados
+            resultado = db.execute_one(
                 """
-                SELECT id FROM presupuestos
-                WHERE usuarioId = %s AND categoriaId = %s AND periodo = %s
+                WITH categoria AS (
+                    SELECT id FROM categorias WHERE id = %s AND usuarioId = %s
+                ), nuevo AS (
+                    INSERT INTO presupuestos (usuarioId, categoriaId, monto_max, periodo, fecha_creacion)
+                    SELECT %s, id, %s, %s::tipo_periodo, %s
+                    FROM categoria
+                    ON CONFLICT (usuarioId, categoriaId, periodo) DO NOTHING
+                    RETURNING id
+                )
+                SELECT EXISTS (SELECT 1 FROM categoria) AS categoria_existe,
+                       (SELECT id FROM nuevo) AS id
                 """,
-                (current_user['user_id'], categoria_id, periodo)
+                (categoria_id, current_user['user_id'],
+                 current_user['user_id'], monto_max, periodo, int(time.time()))
             )
             
-            if existing:
+            if not resultado['categoria_existe']:
+                return jsonify({'error': 'Categoría no encontrada'}), 404
+            
+            if not resultado['id']:
                 return jsonify({
                     'error': 'Ya existe un presupuesto para esta categoría y periodo'
                 }), 409
             
-            # Insertar presupuesto
-            presupuesto_id = db.execute_insert(
-                """
-                INSERT INTO presupuestos (usuarioId, categoriaId, monto_max, periodo, fecha_creacion)
-                VALUES (%s, %s, ROW(%s, %s)::monto, %s, %s)
-                """,
-                (current_user['user_id'], categoria_id, monto_max['cantidad'],
-                 monto_max.get('moneda', 'MXN'), periodo, int(time.time()))
-            )
+            presupuesto_id = resultado['id']
             
             return jsonify({
                 'message': 'Presupuesto creado exitosamente',
@@ -119,15 +124,13 @@ def update_presupuesto(current_user, presupuesto_id):
             
             # Actualizar monto_max si se proporciona
             if 'monto_max' in data:
-                monto_max = data['monto_max']
                 db.execute_update(
                     """
                     UPDATE presupuestos
-                    SET monto_max = ROW(%s, %s)::monto
+                    SET monto_max = %s
                     WHERE id = %s AND usuarioId = %s
                     """,
-                    (monto_max['cantidad'], monto_max.get('moneda', 'MXN'),
-                     presupuesto_id, current_user['user_id'])
+                    (Monto.from_json(data['monto_max']), presupuesto_id, current_user['user_id'])
                 )
             
             return jsonify({'message': 'Presupuesto actualizado exitosamente'}), 200
@@ -158,27 +161,23 @@ def delete_presupuesto(current_user, presupuesto_id):
 
 @presupuestos_bp.route('/<int:presupuesto_id>/estado', methods=['GET'])
 @token_required
+@conditional_get('presupuestos', 'gastos', 'categorias', por_dia=True)
 def get_estado_presupuesto(current_user, presupuesto_id):
-    """Obtiene el estado actual de un presupuesto (gastado vs límite)"""
+    """Obtiene el estado actual de un presupuesto (gastado vs límite)
+
+    El gasto se suma de las cubetas diarias de gastos_diarios dentro de la
+    ventana indicada por ventana_inicio/ventana_fin.
+    """
     try:
         with Database() as db:
-            # Verificar que el presupuesto pertenece al usuario
-            presupuesto = db.execute_one(
-                "SELECT id FROM presupuestos WHERE id = %s AND usuarioId = %s",
-                (presupuesto_id, current_user['user_id'])
-            )
-            
-            if not presupuesto:
-                return jsonify({'error': 'Presupuesto no encontrado'}), 404
-            
-            # Obtener estado del presupuesto
+            # El filtro por usuario verifica que el presupuesto le pertenece
             estado = db.execute_one(
-                "SELECT * FROM vista_estado_presupuestos WHERE id = %s",
-                (presupuesto_id,)
+                "SELECT * FROM vista_estado_presupuestos WHERE id = %s AND usuarioId = %s",
+                (presupuesto_id, current_user['user_id'])
             )
             
             if not estado:
-                return jsonify({'error': 'No se pudo obtener el estado del presupuesto'}), 500
+                return jsonify({'error': 'Presupuesto no encontrado'}), 404
             
             return jsonify(dict(estado)), 200
             
@@ -188,16 +187,67 @@ def get_estado_presupuesto(current_user, presupuesto_id):
 
 @presupuestos_bp.route('/estados', methods=['GET'])
 @token_required
+@conditional_get('presupuestos', 'gastos', 'categorias', por_dia=True)
 def get_todos_estados(current_user):
     """Obtiene el estado de todos los presupuestos del usuario"""
     try:
         with Database() as db:
-            estados = db.execute(
-                "SELECT * FROM vista_estado_presupuestos WHERE usuarioId = %s",
-                (current_user['user_id'],)
-            )
+            estados = estados_presupuestos(db, current_user['user_id'])
             
             return jsonify([dict(estado) for estado in estados]), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@presupuestos_bp.route('/pronostico', methods=['GET'])
+@token_required
+@conditional_get('presupuestos', 'gastos', 'categorias', por_dia=True)
+def get_pronostico(current_user):
+    """Pronostica el gasto de todos los presupuestos del usuario
+
+    Una sola consulta trae el estado de cada presupuesto junto con su serie
+    de gasto diario (el doble de su ventana, hasta 365 días, o al menos la
+    ventana completa); la tendencia y la fecha en que se excedería el
+    límite se calculan para todos a la vez con NumPy.
+    """
+    try:
+        hoy = int(time.time()) // 86400
+        
+        with Database() as db:
+            presupuestos = db.execute(
+                """
+                SELECT e.*, h.historia, s.dias_serie, s.totales
+                FROM vista_estado_presupuestos e
+                CROSS JOIN LATERAL (
+                    SELECT GREATEST(e.ventana_dias, LEAST(2 * e.ventana_dias, 365)) AS historia
+                ) h
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(d.dia ORDER BY d.dia) AS dias_serie,
+                           array_agg(d.total::DOUBLE PRECISION ORDER BY d.dia) AS totales
+                    FROM gastos_diarios d
+                    WHERE d.usuarioId = e.usuarioId
+                      AND d.categoriaId = e.categoriaId
+                      AND d.dia > %s - h.historia
+                      AND d.dia <= %s
+                ) s ON true
+                WHERE e.usuarioId = %s
+                ORDER BY e.id
+                """,
+                (hoy, hoy, current_user['user_id'])
+            )
+        
+        pronosticos = pronosticar_presupuestos(presupuestos, hoy)
+        
+        result = []
+        for presupuesto, pronostico in zip(presupuestos, pronosticos):
+            estado = dict(presupuesto)
+            for columna in ('historia', 'dias_serie', 'totales'):
+                del estado[columna]
+            estado['pronostico'] = pronostico
+            result.append(estado)
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
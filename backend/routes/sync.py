@@ -0,0 +1,99 @@
+from flask import Blueprint, request, jsonify
+from database import Database
+from middleware import token_required
+
+sync_bp = Blueprint('sync', __name__)
+
+# Columnas que se envían de cada recurso (las mismas que en sus listados)
+COLUMNAS_SYNC = {
+    'categorias': ('id', 'nombre', 'tipo', 'descripcion', 'fecha'),
+    'gastos': ('id', 'usuarioId', 'categoriaId', 'monto', 'metodo_pago', 'detalle',
+               'descripcion', 'fecha'),
+    'ingresos': ('id', 'usuarioId', 'categoriaId', 'monto', 'metodo_pago', 'fuente',
+                 'descripcion', 'fecha'),
+    'presupuestos': ('id', 'usuarioId', 'categoriaId', 'monto_max', 'periodo',
+                     'fecha_creacion'),
+    'metas': ('id', 'usuarioId', 'nombre', 'descripcion', 'monto_objetivo', 'monto_actual',
+              'fecha_limite', 'fecha_creacion')
+}
+
+
+@sync_bp.route('', methods=['GET'])
+@token_required
+def sync(current_user):
+    """Obtiene los registros insertados, modificados o eliminados desde un token
+
+    Sin `since` se envían todos los registros del usuario. La respuesta
+    incluye el `token` a usar en la siguiente llamada y, por recurso, los
+    registros vigentes (`actualizados`) y los ids eliminados. Un registro
+    puede repetirse entre dos sincronizaciones; aplicarlo de nuevo es
+    inofensivo.
+
+    Si las lápidas posteriores a `since` ya se purgaron (`flask db
+    purgar-sync`) responde 410: el cliente debe descartar sus datos y
+    sincronizar de nuevo sin `since`.
+    """
+    try:
+        since = request.args.get('since')
+        if since is not None and not since.isdigit():
+            return jsonify({'error': 'Token de sincronización inválido'}), 400
+        
+        usuario_id = current_user['user_id']
+        cambios = {}
+        
+        with Database() as db:
+            # El token se toma antes de leer: lo que confirme después una
+            # transacción todavía en curso tendrá un txid >= token
+            token = db.execute_one(
+                "SELECT pg_snapshot_xmin(pg_current_snapshot())::TEXT AS token"
+            )['token']
+            
+            filtro = " AND c.txid >= %s::xid8" if since is not None else ""
+            
+            for recurso, columnas in COLUMNAS_SYNC.items():
+                params = [usuario_id, recurso, usuario_id]
+                if since is not None:
+                    params.append(since)
+                
+                actualizados = db.execute(
+                    f"""
+                    SELECT {', '.join('r.' + columna for columna in columnas)}
+                    FROM cambios_sync c
+                    JOIN {recurso} r ON r.id = c.registro_id
+                    WHERE c.usuarioId = %s AND c.recurso = %s AND NOT c.eliminado
+                      AND r.usuarioId = %s{filtro}
+                    ORDER BY r.id
+                    """,
+                    params
+                )
+                cambios[recurso] = {'actualizados': actualizados, 'eliminados': []}
+            
+            if since is not None:
+                eliminados = db.execute(
+                    """
+                    SELECT recurso, registro_id
+                    FROM cambios_sync c
+                    WHERE c.usuarioId = %s AND c.eliminado AND c.txid >= %s::xid8
+                    ORDER BY registro_id
+                    """,
+                    (usuario_id, since)
+                )
+                for fila in eliminados:
+                    cambios[fila['recurso']]['eliminados'].append(fila['registro_id'])
+
+                # Se revisa después de leer las lápidas: una purga confirmada
+                # antes de esa lectura ya se ve aquí
+                purgado = db.execute_one(
+                    "SELECT %s::xid8 <= txid AS purgado FROM sync_horizonte",
+                    (since,)
+                )['purgado']
+                if purgado:
+                    return jsonify({
+                        'error': 'El token es anterior a la última purga; se requiere sincronización completa',
+                        'sincronizacion_completa': True
+                    }), 410
+
+        return jsonify({'token': token, 'cambios': cambios}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
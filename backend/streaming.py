@@ -0,0 +1,68 @@
+from itertools import chain
+from flask import Response, current_app, stream_with_context
+from database import Database
+
+# Filas serializadas por cada fragmento enviado al cliente
+CHUNK_ROWS = 500
+
+
+def stream_response(body, mimetype, headers=None):
+    """Construye una respuesta en streaming a partir de un generador
+
+    El primer fragmento se produce antes de responder, de modo que los
+    errores al ejecutar la consulta siguen llegando al manejador de la
+    ruta y se pueden reportar con un 500.
+    """
+    head = next(body, None)
+    chunks = body if head is None else chain([head], body)
+    return Response(
+        stream_with_context(chunks),
+        status=200,
+        mimetype=mimetype,
+        headers=headers
+    )
+
+
+def stream_json_list(query, params=None, transform=None, itersize=2000):
+    """Responde con un arreglo JSON serializado fila por fila
+
+    Las filas se leen con un cursor del lado del servidor y se envían en
+    fragmentos, por lo que la memoria usada no depende del tamaño del
+    resultado.
+    """
+    json_provider = current_app.json
+    if hasattr(json_provider, 'dumps_bytes'):
+        dumps = json_provider.dumps_bytes
+    else:
+        def dumps(row):
+            return json_provider.dumps(row).encode('utf-8')
+
+    def generate():
+        with Database() as db:
+            chunk = [b'[']
+            first = True
+            for row in db.stream(query, params, itersize=itersize):
+                if transform:
+                    row = transform(row)
+                if not first:
+                    chunk.append(b',')
+                chunk.append(dumps(row))
+                first = False
+
+                if len(chunk) >= CHUNK_ROWS * 2:
+                    yield b''.join(chunk)
+                    chunk = []
+            chunk.append(b']')
+            yield b''.join(chunk)
+
+    return stream_response(generate(), 'application/json')
+
+
+def stream_copy(query, params=None, mimetype='text/csv', headers=None):
+    """Responde con la salida de `COPY ... TO STDOUT` sin almacenarla"""
+
+    def generate():
+        with Database() as db:
+            yield from db.copy_to(query, params)
+
+    return stream_response(generate(), mimetype, headers)
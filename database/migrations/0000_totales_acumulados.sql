@@ -0,0 +1,328 @@
+----------------------------------------
+-- Totales acumulados: balance_usuarios y gastos_diarios
+----------------------------------------
+-- Tablas de totales mantenidas con triggers, sus funciones y vistas de
+-- verificación, y las vistas del dashboard leyendo de ellas. Es la única
+-- definición de estos objetos: init_database.sql crea el esquema base y
+-- esta migración corre antes que 0002, que ya los necesita.
+--
+-- Algunas bases ya tienen estos objetos (se crearon con una versión de
+-- init_database.sql que los incluía, y pueden haber aplicado 0001-0010
+-- antes que esta migración). Por eso solo se crea lo que falta y solo se
+-- recalculan las tablas creadas aquí; las funciones se reemplazan porque
+-- es barato y deja la versión vigente.
+
+CREATE TEMP TABLE _totales_nuevos ON COMMIT DROP AS
+SELECT to_regclass('balance_usuarios') IS NULL AS balance,
+       to_regclass('gastos_diarios') IS NULL AS diarios;
+
+CREATE TABLE IF NOT EXISTS balance_usuarios (
+    usuarioId INTEGER PRIMARY KEY REFERENCES usuarios(id),
+    total_ingresos NUMERIC NOT NULL DEFAULT 0,
+    total_gastos NUMERIC NOT NULL DEFAULT 0,
+    num_ingresos BIGINT NOT NULL DEFAULT 0,
+    num_gastos BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS gastos_diarios (
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    categoriaId INTEGER NOT NULL REFERENCES categorias(id),
+    dia INTEGER NOT NULL,
+    total NUMERIC NOT NULL DEFAULT 0,
+    num BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (usuarioId, categoriaId, dia)
+);
+
+-- Día UTC (desde epoch) al que pertenece una fecha en segundos
+CREATE OR REPLACE FUNCTION dia_epoch(fecha BIGINT) RETURNS INTEGER AS $$
+    SELECT floor(fecha / 86400.0)::INTEGER;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Días que abarca la ventana de evaluación de cada periodo
+CREATE OR REPLACE FUNCTION dias_periodo(periodo tipo_periodo) RETURNS INTEGER AS $$
+    SELECT CASE periodo
+               WHEN 'semanal' THEN 7
+               WHEN 'mensual' THEN 30
+               WHEN 'anual' THEN 365
+           END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Aborta con un error claro si hay movimientos con un usuario o categoría
+-- inexistente. gastos e ingresos no tenían llaves foráneas, pero las
+-- tablas de totales y las particionadas (0002) sí: sin esta revisión la
+-- carga fallaría a mitad de camino con una violación de llave foránea.
+CREATE OR REPLACE FUNCTION verificar_movimientos_huerfanos() RETURNS void AS $$
+DECLARE
+    huerfanos TEXT;
+BEGIN
+    SELECT string_agg(format('%s: %s filas con usuarioId inexistente, %s con categoriaId inexistente',
+                             tabla, sin_usuario, sin_categoria), '; ')
+    INTO huerfanos
+    FROM (
+        SELECT 'gastos' AS tabla,
+               COUNT(*) FILTER (WHERE u.id IS NULL) AS sin_usuario,
+               COUNT(*) FILTER (WHERE c.id IS NULL) AS sin_categoria
+        FROM gastos m
+        LEFT JOIN usuarios u ON u.id = m.usuarioId
+        LEFT JOIN categorias c ON c.id = m.categoriaId
+        UNION ALL
+        SELECT 'ingresos',
+               COUNT(*) FILTER (WHERE u.id IS NULL),
+               COUNT(*) FILTER (WHERE c.id IS NULL)
+        FROM ingresos m
+        LEFT JOIN usuarios u ON u.id = m.usuarioId
+        LEFT JOIN categorias c ON c.id = m.categoriaId
+    ) t
+    WHERE sin_usuario > 0 OR sin_categoria > 0;
+
+    IF huerfanos IS NOT NULL THEN
+        RAISE EXCEPTION 'Movimientos huérfanos, corregirlos o eliminarlos antes de migrar: %', huerfanos
+            USING HINT = 'SELECT * FROM gastos g WHERE NOT EXISTS (SELECT 1 FROM categorias c WHERE c.id = g.categoriaId)';
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Aplica las filas afectadas por una sentencia (tablas de transición
+-- "nuevas" y "viejas") a los totales. TG_ARGV[0] es 'gasto' o 'ingreso'.
+CREATE OR REPLACE FUNCTION fn_balance_movimientos() RETURNS trigger AS $$
+DECLARE
+    es_ingreso BOOLEAN := TG_ARGV[0] = 'ingreso';
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO balance_usuarios AS b
+            (usuarioId, total_ingresos, total_gastos, num_ingresos, num_gastos)
+        SELECT usuarioId,
+               CASE WHEN es_ingreso THEN -SUM((monto).cantidad::NUMERIC) ELSE 0 END,
+               CASE WHEN es_ingreso THEN 0 ELSE -SUM((monto).cantidad::NUMERIC) END,
+               CASE WHEN es_ingreso THEN -COUNT(*) ELSE 0 END,
+               CASE WHEN es_ingreso THEN 0 ELSE -COUNT(*) END
+        FROM viejas
+        GROUP BY usuarioId
+        ORDER BY usuarioId
+        ON CONFLICT (usuarioId) DO UPDATE SET
+            total_ingresos = b.total_ingresos + EXCLUDED.total_ingresos,
+            total_gastos = b.total_gastos + EXCLUDED.total_gastos,
+            num_ingresos = b.num_ingresos + EXCLUDED.num_ingresos,
+            num_gastos = b.num_gastos + EXCLUDED.num_gastos;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO balance_usuarios AS b
+            (usuarioId, total_ingresos, total_gastos, num_ingresos, num_gastos)
+        SELECT usuarioId,
+               CASE WHEN es_ingreso THEN SUM((monto).cantidad::NUMERIC) ELSE 0 END,
+               CASE WHEN es_ingreso THEN 0 ELSE SUM((monto).cantidad::NUMERIC) END,
+               CASE WHEN es_ingreso THEN COUNT(*) ELSE 0 END,
+               CASE WHEN es_ingreso THEN 0 ELSE COUNT(*) END
+        FROM nuevas
+        GROUP BY usuarioId
+        ORDER BY usuarioId
+        ON CONFLICT (usuarioId) DO UPDATE SET
+            total_ingresos = b.total_ingresos + EXCLUDED.total_ingresos,
+            total_gastos = b.total_gastos + EXCLUDED.total_gastos,
+            num_ingresos = b.num_ingresos + EXCLUDED.num_ingresos,
+            num_gastos = b.num_gastos + EXCLUDED.num_gastos;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_gastos_diarios() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO gastos_diarios AS d (usuarioId, categoriaId, dia, total, num)
+        SELECT usuarioId, categoriaId, dia_epoch(fecha),
+               -SUM((monto).cantidad::NUMERIC), -COUNT(*)
+        FROM viejas
+        GROUP BY usuarioId, categoriaId, dia_epoch(fecha)
+        ORDER BY 1, 2, 3
+        ON CONFLICT (usuarioId, categoriaId, dia) DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            num = d.num + EXCLUDED.num;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO gastos_diarios AS d (usuarioId, categoriaId, dia, total, num)
+        SELECT usuarioId, categoriaId, dia_epoch(fecha),
+               SUM((monto).cantidad::NUMERIC), COUNT(*)
+        FROM nuevas
+        GROUP BY usuarioId, categoriaId, dia_epoch(fecha)
+        ORDER BY 1, 2, 3
+        ON CONFLICT (usuarioId, categoriaId, dia) DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            num = d.num + EXCLUDED.num;
+    END IF;
+
+    -- Las cubetas que quedan vacías se eliminan: conservan la llave foránea
+    -- a categorias e impedirían eliminar la categoría
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM gastos_diarios d
+        USING (SELECT DISTINCT usuarioId, categoriaId, dia_epoch(fecha) AS dia FROM viejas) v
+        WHERE d.usuarioId = v.usuarioId
+          AND d.categoriaId = v.categoriaId
+          AND d.dia = v.dia
+          AND d.num = 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers por sentencia, solo los que no existan
+DO $$
+DECLARE
+    t RECORD;
+BEGIN
+    FOR t IN
+        SELECT * FROM (VALUES
+            ('trg_balance_gastos_ins', 'gastos', 'INSERT', 'NEW TABLE AS nuevas', 'fn_balance_movimientos(''gasto'')'),
+            ('trg_balance_gastos_upd', 'gastos', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas', 'fn_balance_movimientos(''gasto'')'),
+            ('trg_balance_gastos_del', 'gastos', 'DELETE', 'OLD TABLE AS viejas', 'fn_balance_movimientos(''gasto'')'),
+            ('trg_balance_ingresos_ins', 'ingresos', 'INSERT', 'NEW TABLE AS nuevas', 'fn_balance_movimientos(''ingreso'')'),
+            ('trg_balance_ingresos_upd', 'ingresos', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas', 'fn_balance_movimientos(''ingreso'')'),
+            ('trg_balance_ingresos_del', 'ingresos', 'DELETE', 'OLD TABLE AS viejas', 'fn_balance_movimientos(''ingreso'')'),
+            ('trg_gastos_diarios_ins', 'gastos', 'INSERT', 'NEW TABLE AS nuevas', 'fn_gastos_diarios()'),
+            ('trg_gastos_diarios_upd', 'gastos', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas', 'fn_gastos_diarios()'),
+            ('trg_gastos_diarios_del', 'gastos', 'DELETE', 'OLD TABLE AS viejas', 'fn_gastos_diarios()')
+        ) AS v(nombre, tabla, evento, transicion, funcion)
+    LOOP
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger
+            WHERE tgname = t.nombre AND tgrelid = t.tabla::regclass
+        ) THEN
+            EXECUTE format('CREATE TRIGGER %I AFTER %s ON %I REFERENCING %s '
+                           'FOR EACH STATEMENT EXECUTE FUNCTION %s',
+                           t.nombre, t.evento, t.tabla, t.transicion, t.funcion);
+        END IF;
+    END LOOP;
+END
+$$;
+
+-- Totales recalculados desde cero, para verificar o reconstruir las tablas
+CREATE OR REPLACE VIEW vista_balance_recalculado AS
+SELECT
+    u.id AS usuarioId,
+    COALESCE(i.total, 0) AS total_ingresos,
+    COALESCE(g.total, 0) AS total_gastos,
+    COALESCE(i.num, 0) AS num_ingresos,
+    COALESCE(g.num, 0) AS num_gastos
+FROM usuarios u
+LEFT JOIN (
+    SELECT usuarioId, SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+    FROM ingresos
+    GROUP BY usuarioId
+) i ON u.id = i.usuarioId
+LEFT JOIN (
+    SELECT usuarioId, SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+    FROM gastos
+    GROUP BY usuarioId
+) g ON u.id = g.usuarioId;
+
+CREATE OR REPLACE VIEW vista_gastos_diarios_recalculado AS
+SELECT usuarioId, categoriaId, dia_epoch(fecha) AS dia,
+       SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+FROM gastos
+GROUP BY usuarioId, categoriaId, dia_epoch(fecha);
+
+-- Reconstruyen las tablas bloqueando escrituras mientras tanto
+CREATE OR REPLACE FUNCTION recalcular_balance_usuarios() RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE gastos, ingresos IN SHARE MODE;
+    LOCK TABLE balance_usuarios IN EXCLUSIVE MODE;
+    DELETE FROM balance_usuarios;
+    INSERT INTO balance_usuarios
+        (usuarioId, total_ingresos, total_gastos, num_ingresos, num_gastos)
+    SELECT usuarioId, total_ingresos, total_gastos, num_ingresos, num_gastos
+    FROM vista_balance_recalculado;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recalcular_gastos_diarios() RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE gastos IN SHARE MODE;
+    LOCK TABLE gastos_diarios IN EXCLUSIVE MODE;
+    DELETE FROM gastos_diarios;
+    INSERT INTO gastos_diarios (usuarioId, categoriaId, dia, total, num)
+    SELECT usuarioId, categoriaId, dia, total, num
+    FROM vista_gastos_diarios_recalculado;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Vistas del dashboard leyendo de los totales. Las originales leen gastos
+-- e ingresos y tienen otros tipos de columna: se eliminan para crearlas
+-- de nuevo; si ya leen de los totales solo se reemplazan (sin cambios)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.view_table_usage
+        WHERE view_name = 'vista_balance_usuarios' AND table_name = 'balance_usuarios'
+    ) THEN
+        DROP VIEW IF EXISTS vista_balance_usuarios;
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.view_table_usage
+        WHERE view_name = 'vista_estado_presupuestos' AND table_name = 'gastos_diarios'
+    ) THEN
+        DROP VIEW IF EXISTS vista_estado_presupuestos;
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE VIEW vista_balance_usuarios AS
+SELECT
+    u.id as usuario_id,
+    u.username,
+    COALESCE(b.total_ingresos, 0)::DOUBLE PRECISION as total_ingresos,
+    COALESCE(b.total_gastos, 0)::DOUBLE PRECISION as total_gastos,
+    (COALESCE(b.total_ingresos, 0) - COALESCE(b.total_gastos, 0))::DOUBLE PRECISION as balance
+FROM usuarios u
+LEFT JOIN balance_usuarios b ON u.id = b.usuarioId;
+
+-- La ventana de evaluación son los últimos N días UTC completos, incluido
+-- el día actual; ventana_inicio y ventana_fin la expresan en segundos.
+CREATE OR REPLACE VIEW vista_estado_presupuestos AS
+SELECT
+    p.id,
+    p.usuarioId,
+    p.categoriaId,
+    c.nombre AS categoria_nombre,
+    p.periodo,
+    (p.monto_max).cantidad AS limite,
+    COALESCE(s.gastado, 0)::DOUBLE PRECISION AS gastado,
+    CASE
+        WHEN COALESCE(s.gastado, 0) > (p.monto_max).cantidad THEN 'excedido'
+        WHEN COALESCE(s.gastado, 0) > (p.monto_max).cantidad * 0.8 THEN 'alerta'
+        ELSE 'normal'
+    END AS estado,
+    v.dias AS ventana_dias,
+    v.primer_dia::BIGINT * 86400 AS ventana_inicio,
+    (v.hoy + 1)::BIGINT * 86400 - 1 AS ventana_fin
+FROM presupuestos p
+JOIN categorias c ON p.categoriaId = c.id
+CROSS JOIN LATERAL (
+    SELECT dias_periodo(p.periodo) AS dias,
+           h.hoy,
+           h.hoy - dias_periodo(p.periodo) + 1 AS primer_dia
+    FROM (SELECT dia_epoch(EXTRACT(EPOCH FROM NOW())::BIGINT) AS hoy) h
+) v
+LEFT JOIN LATERAL (
+    SELECT SUM(d.total) AS gastado
+    FROM gastos_diarios d
+    WHERE d.usuarioId = p.usuarioId
+      AND d.categoriaId = p.categoriaId
+      AND d.dia >= v.primer_dia
+) s ON true;
+
+-- Carga inicial de las tablas creadas por esta migración
+SELECT verificar_movimientos_huerfanos() FROM _totales_nuevos WHERE balance OR diarios;
+SELECT recalcular_balance_usuarios() FROM _totales_nuevos WHERE balance;
+SELECT recalcular_gastos_diarios() FROM _totales_nuevos WHERE diarios;
@@ -0,0 +1,35 @@
+-- migrate: no-transaction
+----------------------------------------
+-- Índices para las consultas más frecuentes
+----------------------------------------
+-- Con herencia de tablas los índices del padre no cubren a las tablas
+-- hijas, por eso se crean directamente en gastos e ingresos. Se crean con
+-- CONCURRENTLY para no bloquear escrituras durante el despliegue. Si la
+-- construcción se interrumpe el índice queda inválido; al reintentar, el
+-- migrador lo elimina y lo vuelve a crear en lugar de omitirlo.
+
+-- Listados por usuario ordenados por fecha (y paginación por (fecha, id))
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gastos_usuario_fecha
+    ON gastos (usuarioId, fecha DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ingresos_usuario_fecha
+    ON ingresos (usuarioId, fecha DESC, id DESC);
+
+-- Listados y exportación filtrados por categoría y rango de fechas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gastos_usuario_categoria_fecha
+    ON gastos (usuarioId, categoriaId, fecha);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ingresos_usuario_categoria_fecha
+    ON ingresos (usuarioId, categoriaId, fecha);
+
+-- Conteo de movimientos de una categoría antes de eliminarla
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gastos_categoria
+    ON gastos (categoriaId);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ingresos_categoria
+    ON ingresos (categoriaId);
+
+-- Presupuestos y metas por usuario
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_presupuestos_usuario
+    ON presupuestos (usuarioId, fecha_creacion DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_presupuestos_categoria
+    ON presupuestos (categoriaId);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metas_usuario
+    ON metas (usuarioId);
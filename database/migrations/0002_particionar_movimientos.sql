@@ -0,0 +1,204 @@
+----------------------------------------
+-- Particionamiento declarativo de gastos e ingresos
+----------------------------------------
+-- gastos e ingresos dejan de heredar de movimientos y pasan a ser tablas
+-- particionadas por rango de fecha (una partición por mes, UTC). Las
+-- consultas con rango de fechas solo recorren las particiones necesarias
+-- y ahora sí se aplican llaves foráneas. movimientos se vuelve una vista.
+--
+-- REQUIERE VENTANA DE MANTENIMIENTO: corre en una sola transacción que
+-- toma ACCESS EXCLUSIVE sobre gastos, ingresos y movimientos desde el
+-- RENAME hasta el COMMIT. Lecturas y escrituras de movimientos quedan
+-- bloqueadas mientras se copian todas las filas y se crean los índices
+-- (el tiempo crece con el tamaño de las tablas). Detener la aplicación
+-- antes de `flask db migrar`.
+
+-- Crea las particiones mensuales de gastos e ingresos entre los meses de
+-- `desde` y `hasta` (inclusive) que aún no existan. Si la partición
+-- por defecto tiene filas del rango nuevo, se mueven a la partición
+-- (borrando e insertando por la tabla padre para que los triggers de
+-- totales queden en cero).
+CREATE OR REPLACE FUNCTION crear_particiones_movimientos(desde DATE, hasta DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    tabla TEXT;
+    mes DATE;
+    nombre TEXT;
+    inicio BIGINT;
+    fin BIGINT;
+    creadas INTEGER := 0;
+    hay_filas BOOLEAN;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['gastos', 'ingresos'] LOOP
+        mes := date_trunc('month', desde)::DATE;
+        WHILE mes <= hasta LOOP
+            nombre := format('%s_p%s', tabla, to_char(mes, 'YYYY_MM'));
+            inicio := EXTRACT(EPOCH FROM mes::TIMESTAMP AT TIME ZONE 'UTC')::BIGINT;
+            fin := EXTRACT(EPOCH FROM (mes + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC')::BIGINT;
+
+            IF to_regclass(nombre) IS NULL THEN
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE fecha >= %s AND fecha < %s)',
+                               tabla, inicio, fin)
+                    INTO hay_filas;
+
+                IF hay_filas THEN
+                    EXECUTE format('CREATE TEMP TABLE _mover (LIKE %I) ON COMMIT DROP', tabla);
+                    EXECUTE format('WITH m AS (DELETE FROM %I WHERE fecha >= %s AND fecha < %s RETURNING *)
+                                    INSERT INTO _mover SELECT * FROM m', tabla, inicio, fin);
+                END IF;
+
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%s) TO (%s)',
+                               nombre, tabla, inicio, fin);
+
+                IF hay_filas THEN
+                    EXECUTE format('INSERT INTO %I SELECT * FROM _mover', tabla);
+                    DROP TABLE _mover;
+                END IF;
+
+                creadas := creadas + 1;
+            END IF;
+
+            mes := (mes + INTERVAL '1 month')::DATE;
+        END LOOP;
+    END LOOP;
+    RETURN creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Las tablas con herencia no tenían llaves foráneas: una fila con un
+-- usuario o categoría inexistente haría fallar la copia a mitad de camino.
+-- Se revisa antes y se aborta con el detalle (ver 0000_totales_acumulados).
+SELECT verificar_movimientos_huerfanos();
+
+-- Las tablas con herencia se conservan con otro nombre mientras se copian
+ALTER TABLE gastos RENAME TO gastos_herencia;
+ALTER TABLE ingresos RENAME TO ingresos_herencia;
+
+-- Mismas columnas y en el mismo orden que las tablas heredadas
+CREATE TABLE gastos (
+    id INTEGER NOT NULL DEFAULT nextval('entidad_financiera_id_seq'),
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    descripcion TEXT,
+    fecha BIGINT NOT NULL,
+    categoriaId INTEGER NOT NULL REFERENCES categorias(id),
+    monto monto NOT NULL,
+    metodo_pago TEXT NOT NULL,
+    detalle TEXT DEFAULT 'Gasto',
+    PRIMARY KEY (id, fecha)
+) PARTITION BY RANGE (fecha);
+
+CREATE TABLE ingresos (
+    id INTEGER NOT NULL DEFAULT nextval('entidad_financiera_id_seq'),
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    descripcion TEXT,
+    fecha BIGINT NOT NULL,
+    categoriaId INTEGER NOT NULL REFERENCES categorias(id),
+    monto monto NOT NULL,
+    metodo_pago TEXT NOT NULL,
+    fuente TEXT DEFAULT 'Ingreso',
+    PRIMARY KEY (id, fecha)
+) PARTITION BY RANGE (fecha);
+
+-- Fechas fuera de las particiones mensuales (muy antiguas o futuras)
+CREATE TABLE gastos_default PARTITION OF gastos DEFAULT;
+CREATE TABLE ingresos_default PARTITION OF ingresos DEFAULT;
+
+-- Particiones desde el dato más antiguo (máximo 5 años atrás) hasta 3
+-- meses adelante; lo anterior queda en la partición por defecto
+SELECT crear_particiones_movimientos(
+    GREATEST(
+        COALESCE(
+            (SELECT to_timestamp(MIN(fecha)) AT TIME ZONE 'UTC' FROM movimientos)::DATE,
+            CURRENT_DATE
+        ),
+        (CURRENT_DATE - INTERVAL '5 years')::DATE
+    ),
+    (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+
+-- Copiar los datos; los triggers de totales aún no existen en las tablas
+-- nuevas, así que balance_usuarios y gastos_diarios no cambian
+INSERT INTO gastos SELECT * FROM ONLY gastos_herencia;
+INSERT INTO ingresos SELECT * FROM ONLY ingresos_herencia;
+
+-- Eliminar las tablas heredadas y las vistas que dependen de ellas
+DROP VIEW vista_balance_recalculado;
+DROP VIEW vista_gastos_diarios_recalculado;
+DROP TABLE gastos_herencia;
+DROP TABLE ingresos_herencia;
+DROP TABLE movimientos;
+
+-- movimientos se conserva como vista de ambos tipos
+CREATE VIEW movimientos AS
+SELECT id, usuarioId, descripcion, fecha, categoriaId, monto, metodo_pago FROM gastos
+UNION ALL
+SELECT id, usuarioId, descripcion, fecha, categoriaId, monto, metodo_pago FROM ingresos;
+
+-- Índices de 0001_indices_rendimiento, ahora en las tablas particionadas
+-- (se propagan a cada partición, incluidas las futuras)
+CREATE INDEX idx_gastos_usuario_fecha ON gastos (usuarioId, fecha DESC, id DESC);
+CREATE INDEX idx_ingresos_usuario_fecha ON ingresos (usuarioId, fecha DESC, id DESC);
+CREATE INDEX idx_gastos_usuario_categoria_fecha ON gastos (usuarioId, categoriaId, fecha);
+CREATE INDEX idx_ingresos_usuario_categoria_fecha ON ingresos (usuarioId, categoriaId, fecha);
+CREATE INDEX idx_gastos_categoria ON gastos (categoriaId);
+CREATE INDEX idx_ingresos_categoria ON ingresos (categoriaId);
+
+-- Triggers de balance_usuarios y gastos_diarios
+CREATE TRIGGER trg_balance_gastos_ins AFTER INSERT ON gastos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('gasto');
+CREATE TRIGGER trg_balance_gastos_upd AFTER UPDATE ON gastos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('gasto');
+CREATE TRIGGER trg_balance_gastos_del AFTER DELETE ON gastos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('gasto');
+
+CREATE TRIGGER trg_balance_ingresos_ins AFTER INSERT ON ingresos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('ingreso');
+CREATE TRIGGER trg_balance_ingresos_upd AFTER UPDATE ON ingresos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('ingreso');
+CREATE TRIGGER trg_balance_ingresos_del AFTER DELETE ON ingresos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_balance_movimientos('ingreso');
+
+CREATE TRIGGER trg_gastos_diarios_ins AFTER INSERT ON gastos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_gastos_diarios();
+CREATE TRIGGER trg_gastos_diarios_upd AFTER UPDATE ON gastos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_gastos_diarios();
+CREATE TRIGGER trg_gastos_diarios_del AFTER DELETE ON gastos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_gastos_diarios();
+
+-- Vistas de verificación (mismas definiciones que en 0000_totales_acumulados)
+CREATE VIEW vista_balance_recalculado AS
+SELECT
+    u.id AS usuarioId,
+    COALESCE(i.total, 0) AS total_ingresos,
+    COALESCE(g.total, 0) AS total_gastos,
+    COALESCE(i.num, 0) AS num_ingresos,
+    COALESCE(g.num, 0) AS num_gastos
+FROM usuarios u
+LEFT JOIN (
+    SELECT usuarioId, SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+    FROM ingresos
+    GROUP BY usuarioId
+) i ON u.id = i.usuarioId
+LEFT JOIN (
+    SELECT usuarioId, SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+    FROM gastos
+    GROUP BY usuarioId
+) g ON u.id = g.usuarioId;
+
+CREATE VIEW vista_gastos_diarios_recalculado AS
+SELECT usuarioId, categoriaId, dia_epoch(fecha) AS dia,
+       SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+FROM gastos
+GROUP BY usuarioId, categoriaId, dia_epoch(fecha);
+
+ANALYZE gastos;
+ANALYZE ingresos;
@@ -0,0 +1,35 @@
+-- migrate: no-transaction
+----------------------------------------
+-- Un presupuesto por usuario, categoría y periodo
+----------------------------------------
+-- Hasta ahora la regla solo se verificaba en la aplicación con una
+-- consulta previa. Con el índice único, create_presupuesto usa
+-- INSERT ... ON CONFLICT DO NOTHING en un solo viaje a la base de datos.
+
+-- Con duplicados el índice no se puede crear: la migración se detiene
+-- indicando cuáles son, para resolverlos a mano antes de reintentar
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(format('usuario %s, categoría %s, %s (ids %s)',
+                             usuarioId, categoriaId, periodo, ids), '; ')
+    INTO duplicados
+    FROM (
+        SELECT usuarioId, categoriaId, periodo,
+               string_agg(id::TEXT, ', ' ORDER BY id) AS ids
+        FROM presupuestos
+        GROUP BY usuarioId, categoriaId, periodo
+        HAVING COUNT(*) > 1
+    ) d;
+
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'Presupuestos duplicados por usuario, categoría y periodo: %', duplicados;
+    END IF;
+END
+$$;
+
+-- Si un intento anterior dejó el índice inválido, el migrador lo vuelve
+-- a crear y verifica que quede válido
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_presupuestos_usuario_categoria_periodo
+    ON presupuestos (usuarioId, categoriaId, periodo);
@@ -0,0 +1,19 @@
+----------------------------------------
+-- Historial de contribuciones a metas de ahorro
+----------------------------------------
+-- Cada contribución se registra aquí y, en la misma sentencia, se suma al
+-- monto_actual de la meta, que queda como total acumulado. El UPDATE
+-- bloquea la fila de la meta, así que contribuciones simultáneas no se
+-- pierden. El monto inicial con el que se crea una meta no se registra.
+
+CREATE TABLE IF NOT EXISTS meta_contribuciones (
+    id BIGSERIAL PRIMARY KEY,
+    metaId INTEGER NOT NULL REFERENCES metas(id) ON DELETE CASCADE,
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    cantidad REAL NOT NULL,
+    fecha BIGINT NOT NULL
+);
+
+-- Historial paginado por (fecha, id) de una meta
+CREATE INDEX IF NOT EXISTS idx_meta_contribuciones_meta_fecha
+    ON meta_contribuciones (metaId, fecha DESC, id DESC);
@@ -0,0 +1,99 @@
+----------------------------------------
+-- Versiones de datos por usuario y recurso (ETag / GET condicional)
+----------------------------------------
+-- Cada escritura sobre un recurso incrementa la versión de los usuarios
+-- afectados. Las rutas GET derivan su ETag de estas versiones y responden
+-- 304 sin ejecutar la consulta principal si el cliente ya tiene los datos.
+-- Se usan triggers para que ninguna escritura (rutas, importación masiva,
+-- comandos de mantenimiento) pueda olvidar incrementar la versión.
+
+CREATE TABLE IF NOT EXISTS versiones_datos (
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    recurso TEXT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (usuarioId, recurso)
+);
+
+-- TG_ARGV[0]: nombre del recurso cuya versión se incrementa
+CREATE OR REPLACE FUNCTION fn_version_datos() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO versiones_datos AS v (usuarioId, recurso, version)
+        SELECT DISTINCT usuarioId, TG_ARGV[0], 1 FROM nuevas
+        ORDER BY usuarioId
+        ON CONFLICT (usuarioId, recurso) DO UPDATE SET version = v.version + 1;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO versiones_datos AS v (usuarioId, recurso, version)
+        SELECT usuarioId, TG_ARGV[0], 1
+        FROM (SELECT usuarioId FROM nuevas UNION SELECT usuarioId FROM viejas) u
+        ORDER BY usuarioId
+        ON CONFLICT (usuarioId, recurso) DO UPDATE SET version = v.version + 1;
+    ELSE
+        INSERT INTO versiones_datos AS v (usuarioId, recurso, version)
+        SELECT DISTINCT usuarioId, TG_ARGV[0], 1 FROM viejas
+        ORDER BY usuarioId
+        ON CONFLICT (usuarioId, recurso) DO UPDATE SET version = v.version + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers por sentencia: una carga masiva incrementa cada versión una vez
+CREATE TRIGGER trg_version_categorias_ins AFTER INSERT ON categorias
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('categorias');
+CREATE TRIGGER trg_version_categorias_upd AFTER UPDATE ON categorias
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('categorias');
+CREATE TRIGGER trg_version_categorias_del AFTER DELETE ON categorias
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('categorias');
+
+CREATE TRIGGER trg_version_gastos_ins AFTER INSERT ON gastos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('gastos');
+CREATE TRIGGER trg_version_gastos_upd AFTER UPDATE ON gastos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('gastos');
+CREATE TRIGGER trg_version_gastos_del AFTER DELETE ON gastos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('gastos');
+
+CREATE TRIGGER trg_version_ingresos_ins AFTER INSERT ON ingresos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('ingresos');
+CREATE TRIGGER trg_version_ingresos_upd AFTER UPDATE ON ingresos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('ingresos');
+CREATE TRIGGER trg_version_ingresos_del AFTER DELETE ON ingresos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('ingresos');
+
+CREATE TRIGGER trg_version_presupuestos_ins AFTER INSERT ON presupuestos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('presupuestos');
+CREATE TRIGGER trg_version_presupuestos_upd AFTER UPDATE ON presupuestos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('presupuestos');
+CREATE TRIGGER trg_version_presupuestos_del AFTER DELETE ON presupuestos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('presupuestos');
+
+CREATE TRIGGER trg_version_metas_ins AFTER INSERT ON metas
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('metas');
+CREATE TRIGGER trg_version_metas_upd AFTER UPDATE ON metas
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('metas');
+CREATE TRIGGER trg_version_metas_del AFTER DELETE ON metas
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('metas');
+
+-- El historial de contribuciones se sirve bajo el recurso 'metas'
+CREATE TRIGGER trg_version_meta_contribuciones_ins AFTER INSERT ON meta_contribuciones
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('metas');
+CREATE TRIGGER trg_version_meta_contribuciones_del AFTER DELETE ON meta_contribuciones
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_version_datos('metas');
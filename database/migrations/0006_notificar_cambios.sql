@@ -0,0 +1,40 @@
+----------------------------------------
+-- Aviso de cambios entre procesos (LISTEN/NOTIFY)
+----------------------------------------
+-- Además de incrementar la versión, cada escritura envía por el canal
+-- 'cambios_datos' un aviso {"usuarioId": ..., "recurso": ...} por usuario
+-- afectado. PostgreSQL lo entrega solo al confirmar la transacción y
+-- descarta los avisos repetidos dentro de la misma; cada proceso del
+-- backend escucha el canal para invalidar sus cachés en memoria.
+
+CREATE OR REPLACE FUNCTION fn_version_datos() RETURNS trigger AS $$
+DECLARE
+    usuarios INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT usuarioId) INTO usuarios FROM nuevas;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT usuarioId) INTO usuarios
+        FROM (SELECT usuarioId FROM nuevas UNION ALL SELECT usuarioId FROM viejas) u;
+    ELSE
+        SELECT array_agg(DISTINCT usuarioId) INTO usuarios FROM viejas;
+    END IF;
+
+    IF usuarios IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO versiones_datos AS v (usuarioId, recurso, version)
+    SELECT u, TG_ARGV[0], 1 FROM unnest(usuarios) u
+    ORDER BY u
+    ON CONFLICT (usuarioId, recurso) DO UPDATE SET version = v.version + 1;
+
+    PERFORM pg_notify(
+        'cambios_datos',
+        json_build_object('usuarioId', u, 'recurso', TG_ARGV[0])::text
+    )
+    FROM unnest(usuarios) u;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,114 @@
+----------------------------------------
+-- movimientos_diarios: cubetas diarias para la analítica de movimientos
+----------------------------------------
+-- Total y número de gastos e ingresos por usuario, día UTC, tipo,
+-- categoría y método de pago, mantenidos con triggers por sentencia. Las
+-- gráficas por día/semana/mes leen a lo más unas cuantas cubetas por día
+-- en vez de recorrer todos los movimientos.
+
+CREATE TABLE movimientos_diarios (
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    dia INTEGER NOT NULL,
+    tipo TEXT NOT NULL CHECK (tipo IN ('gasto', 'ingreso')),
+    categoriaId INTEGER NOT NULL REFERENCES categorias(id),
+    metodo_pago TEXT NOT NULL,
+    total NUMERIC NOT NULL DEFAULT 0,
+    num BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (usuarioId, dia, tipo, categoriaId, metodo_pago)
+);
+
+-- TG_ARGV[0]: 'gasto' o 'ingreso'
+CREATE OR REPLACE FUNCTION fn_movimientos_diarios() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO movimientos_diarios AS d
+            (usuarioId, dia, tipo, categoriaId, metodo_pago, total, num)
+        SELECT usuarioId, dia_epoch(fecha), TG_ARGV[0], categoriaId, metodo_pago,
+               -SUM((monto).cantidad::NUMERIC), -COUNT(*)
+        FROM viejas
+        GROUP BY usuarioId, dia_epoch(fecha), categoriaId, metodo_pago
+        ORDER BY 1, 2, 4, 5
+        ON CONFLICT (usuarioId, dia, tipo, categoriaId, metodo_pago) DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            num = d.num + EXCLUDED.num;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO movimientos_diarios AS d
+            (usuarioId, dia, tipo, categoriaId, metodo_pago, total, num)
+        SELECT usuarioId, dia_epoch(fecha), TG_ARGV[0], categoriaId, metodo_pago,
+               SUM((monto).cantidad::NUMERIC), COUNT(*)
+        FROM nuevas
+        GROUP BY usuarioId, dia_epoch(fecha), categoriaId, metodo_pago
+        ORDER BY 1, 2, 4, 5
+        ON CONFLICT (usuarioId, dia, tipo, categoriaId, metodo_pago) DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            num = d.num + EXCLUDED.num;
+    END IF;
+
+    -- Las cubetas vacías se eliminan para no impedir borrar la categoría
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM movimientos_diarios d
+        USING (SELECT DISTINCT usuarioId, dia_epoch(fecha) AS dia FROM viejas) v
+        WHERE d.usuarioId = v.usuarioId
+          AND d.dia = v.dia
+          AND d.tipo = TG_ARGV[0]
+          AND d.num = 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_movimientos_diarios_gastos_ins AFTER INSERT ON gastos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('gasto');
+CREATE TRIGGER trg_movimientos_diarios_gastos_upd AFTER UPDATE ON gastos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('gasto');
+CREATE TRIGGER trg_movimientos_diarios_gastos_del AFTER DELETE ON gastos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('gasto');
+
+CREATE TRIGGER trg_movimientos_diarios_ingresos_ins AFTER INSERT ON ingresos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('ingreso');
+CREATE TRIGGER trg_movimientos_diarios_ingresos_upd AFTER UPDATE ON ingresos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('ingreso');
+CREATE TRIGGER trg_movimientos_diarios_ingresos_del AFTER DELETE ON ingresos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_movimientos_diarios('ingreso');
+
+-- Cubetas recalculadas desde cero, para verificar o reconstruir la tabla
+CREATE VIEW vista_movimientos_diarios_recalculado AS
+SELECT usuarioId, dia_epoch(fecha) AS dia, 'gasto'::TEXT AS tipo, categoriaId, metodo_pago,
+       SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+FROM gastos
+GROUP BY usuarioId, dia_epoch(fecha), categoriaId, metodo_pago
+UNION ALL
+SELECT usuarioId, dia_epoch(fecha) AS dia, 'ingreso'::TEXT AS tipo, categoriaId, metodo_pago,
+       SUM((monto).cantidad::NUMERIC) AS total, COUNT(*) AS num
+FROM ingresos
+GROUP BY usuarioId, dia_epoch(fecha), categoriaId, metodo_pago;
+
+-- Reconstruye movimientos_diarios bloqueando escrituras mientras tanto
+CREATE OR REPLACE FUNCTION recalcular_movimientos_diarios() RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE gastos IN SHARE MODE;
+    LOCK TABLE ingresos IN SHARE MODE;
+    LOCK TABLE movimientos_diarios IN EXCLUSIVE MODE;
+    DELETE FROM movimientos_diarios;
+    INSERT INTO movimientos_diarios (usuarioId, dia, tipo, categoriaId, metodo_pago, total, num)
+    SELECT usuarioId, dia, tipo, categoriaId, metodo_pago, total, num
+    FROM vista_movimientos_diarios_recalculado;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial con los movimientos existentes
+SELECT recalcular_movimientos_diarios();
+
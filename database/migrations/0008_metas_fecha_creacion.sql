@@ -0,0 +1,13 @@
+----------------------------------------
+-- metas.fecha_creacion
+----------------------------------------
+-- Las rutas de metas ya la escriben y ordenan por ella, pero el esquema
+-- inicial no la incluía. Las proyecciones la usan como inicio del periodo
+-- observado; las metas existentes toman la fecha de la migración.
+
+ALTER TABLE metas ADD COLUMN IF NOT EXISTS fecha_creacion BIGINT;
+
+UPDATE metas SET fecha_creacion = EXTRACT(EPOCH FROM NOW())::BIGINT
+WHERE fecha_creacion IS NULL;
+
+ALTER TABLE metas ALTER COLUMN fecha_creacion SET NOT NULL;
@@ -0,0 +1,111 @@
+----------------------------------------
+-- cambios_sync: registro de cambios para la sincronización incremental
+----------------------------------------
+-- Una fila por registro de cada recurso con el id de la última transacción
+-- que lo insertó, modificó o eliminó (las eliminaciones quedan como
+-- lápidas). /api/sync devuelve lo cambiado desde un token, que es el xmin
+-- del snapshot de la sincronización anterior: toda transacción anterior a
+-- él ya había terminado, así que ningún cambio confirmado se pierde.
+
+CREATE TABLE cambios_sync (
+    recurso TEXT NOT NULL,
+    registro_id BIGINT NOT NULL,
+    usuarioId INTEGER NOT NULL REFERENCES usuarios(id),
+    txid xid8 NOT NULL,
+    eliminado BOOLEAN NOT NULL DEFAULT false,
+    PRIMARY KEY (recurso, registro_id)
+);
+
+CREATE INDEX idx_cambios_sync_usuario_recurso_txid
+    ON cambios_sync (usuarioId, recurso, txid);
+
+-- TG_ARGV[0]: nombre del recurso
+CREATE OR REPLACE FUNCTION fn_cambios_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO cambios_sync AS c (recurso, registro_id, usuarioId, txid, eliminado)
+        SELECT TG_ARGV[0], id, usuarioId, pg_current_xact_id(), true
+        FROM viejas
+        ORDER BY id
+        ON CONFLICT (recurso, registro_id) DO UPDATE SET
+            usuarioId = EXCLUDED.usuarioId,
+            txid = EXCLUDED.txid,
+            eliminado = true;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO cambios_sync AS c (recurso, registro_id, usuarioId, txid, eliminado)
+        SELECT TG_ARGV[0], id, usuarioId, pg_current_xact_id(), false
+        FROM nuevas
+        ORDER BY id
+        ON CONFLICT (recurso, registro_id) DO UPDATE SET
+            usuarioId = EXCLUDED.usuarioId,
+            txid = EXCLUDED.txid,
+            eliminado = false;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_cambios_sync_gastos_ins AFTER INSERT ON gastos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('gastos');
+CREATE TRIGGER trg_cambios_sync_gastos_upd AFTER UPDATE ON gastos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('gastos');
+CREATE TRIGGER trg_cambios_sync_gastos_del AFTER DELETE ON gastos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('gastos');
+
+CREATE TRIGGER trg_cambios_sync_ingresos_ins AFTER INSERT ON ingresos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('ingresos');
+CREATE TRIGGER trg_cambios_sync_ingresos_upd AFTER UPDATE ON ingresos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('ingresos');
+CREATE TRIGGER trg_cambios_sync_ingresos_del AFTER DELETE ON ingresos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('ingresos');
+
+CREATE TRIGGER trg_cambios_sync_categorias_ins AFTER INSERT ON categorias
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('categorias');
+CREATE TRIGGER trg_cambios_sync_categorias_upd AFTER UPDATE ON categorias
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('categorias');
+CREATE TRIGGER trg_cambios_sync_categorias_del AFTER DELETE ON categorias
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('categorias');
+
+CREATE TRIGGER trg_cambios_sync_presupuestos_ins AFTER INSERT ON presupuestos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('presupuestos');
+CREATE TRIGGER trg_cambios_sync_presupuestos_upd AFTER UPDATE ON presupuestos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('presupuestos');
+CREATE TRIGGER trg_cambios_sync_presupuestos_del AFTER DELETE ON presupuestos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('presupuestos');
+
+CREATE TRIGGER trg_cambios_sync_metas_ins AFTER INSERT ON metas
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('metas');
+CREATE TRIGGER trg_cambios_sync_metas_upd AFTER UPDATE ON metas
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('metas');
+CREATE TRIGGER trg_cambios_sync_metas_del AFTER DELETE ON metas
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_cambios_sync('metas');
+
+-- Los registros existentes entran como cambios de esta migración
+INSERT INTO cambios_sync (recurso, registro_id, usuarioId, txid)
+SELECT 'gastos', id, usuarioId, pg_current_xact_id() FROM gastos
+UNION ALL
+SELECT 'ingresos', id, usuarioId, pg_current_xact_id() FROM ingresos
+UNION ALL
+SELECT 'categorias', id, usuarioId, pg_current_xact_id() FROM categorias
+UNION ALL
+SELECT 'presupuestos', id, usuarioId, pg_current_xact_id() FROM presupuestos
+UNION ALL
+SELECT 'metas', id, usuarioId, pg_current_xact_id() FROM metas;
@@ -0,0 +1,105 @@
+----------------------------------------
+-- Búsqueda de texto completo y difusa en gastos e ingresos
+----------------------------------------
+-- Columnas generadas con el texto buscable (detalle o fuente más la
+-- descripción) y su tsvector en español. Los índices GIN incluyen
+-- usuarioId (btree_gin) para que cada búsqueda solo recorra las entradas
+-- del usuario; pg_trgm permite coincidencias con errores de escritura o
+-- palabras incompletas.
+--
+-- REQUIERE VENTANA DE MANTENIMIENTO. Agregar columnas STORED reescribe
+-- cada partición de gastos e ingresos con un bloqueo ACCESS EXCLUSIVE, y
+-- los cuatro índices GIN se construyen sin CONCURRENTLY en la misma
+-- transacción: lecturas y escrituras de movimientos quedan bloqueadas
+-- hasta el commit, con una duración proporcional al tamaño de las tablas.
+-- No se usa una columna normal con relleno por lotes porque cada UPDATE
+-- del relleno dispararía los triggers de totales, versiones y
+-- cambios_sync para todas las filas (todos los clientes tendrían que
+-- volver a sincronizar todo).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+ALTER TABLE gastos
+    ADD COLUMN busqueda_texto TEXT GENERATED ALWAYS AS (
+        coalesce(detalle, '') || ' ' || coalesce(descripcion, '')
+    ) STORED,
+    ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+        to_tsvector('spanish'::regconfig, coalesce(detalle, '') || ' ' || coalesce(descripcion, ''))
+    ) STORED;
+
+ALTER TABLE ingresos
+    ADD COLUMN busqueda_texto TEXT GENERATED ALWAYS AS (
+        coalesce(fuente, '') || ' ' || coalesce(descripcion, '')
+    ) STORED,
+    ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+        to_tsvector('spanish'::regconfig, coalesce(fuente, '') || ' ' || coalesce(descripcion, ''))
+    ) STORED;
+
+CREATE INDEX idx_gastos_busqueda ON gastos USING gin (usuarioId, busqueda);
+CREATE INDEX idx_ingresos_busqueda ON ingresos USING gin (usuarioId, busqueda);
+CREATE INDEX idx_gastos_busqueda_trgm ON gastos USING gin (usuarioId, busqueda_texto gin_trgm_ops);
+CREATE INDEX idx_ingresos_busqueda_trgm ON ingresos USING gin (usuarioId, busqueda_texto gin_trgm_ops);
+
+-- Las columnas generadas no admiten valores en un INSERT: al mover filas
+-- de la partición por defecto solo se copian las columnas normales
+CREATE OR REPLACE FUNCTION crear_particiones_movimientos(desde DATE, hasta DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    tabla TEXT;
+    mes DATE;
+    nombre TEXT;
+    inicio BIGINT;
+    fin BIGINT;
+    creadas INTEGER := 0;
+    hay_filas BOOLEAN;
+    columnas TEXT;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['gastos', 'ingresos'] LOOP
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columnas
+        FROM pg_attribute
+        WHERE attrelid = tabla::regclass
+          AND attnum > 0
+          AND NOT attisdropped
+          AND attgenerated = '';
+
+        mes := date_trunc('month', desde)::DATE;
+        WHILE mes <= hasta LOOP
+            nombre := format('%s_p%s', tabla, to_char(mes, 'YYYY_MM'));
+            inicio := EXTRACT(EPOCH FROM mes::TIMESTAMP AT TIME ZONE 'UTC')::BIGINT;
+            fin := EXTRACT(EPOCH FROM (mes + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC')::BIGINT;
+
+            IF to_regclass(nombre) IS NULL THEN
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE fecha >= %s AND fecha < %s)',
+                               tabla, inicio, fin)
+                    INTO hay_filas;
+
+                IF hay_filas THEN
+                    EXECUTE format('CREATE TEMP TABLE _mover (LIKE %I) ON COMMIT DROP', tabla);
+                    EXECUTE format('WITH m AS (DELETE FROM %I WHERE fecha >= %s AND fecha < %s
+                                               RETURNING %s)
+                                    INSERT INTO _mover (%s) SELECT * FROM m',
+                                   tabla, inicio, fin, columnas, columnas);
+                END IF;
+
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%s) TO (%s)',
+                               nombre, tabla, inicio, fin);
+
+                IF hay_filas THEN
+                    EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM _mover',
+                                   tabla, columnas, columnas);
+                    DROP TABLE _mover;
+                END IF;
+
+                creadas := creadas + 1;
+            END IF;
+
+            mes := (mes + INTERVAL '1 month')::DATE;
+        END LOOP;
+    END LOOP;
+    RETURN creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+ANALYZE gastos;
+ANALYZE ingresos;
@@ -0,0 +1,84 @@
+----------------------------------------
+-- Purga de lápidas de cambios_sync
+----------------------------------------
+-- Las eliminaciones quedan en cambios_sync como lápidas para que los
+-- clientes se enteren en su siguiente sincronización, pero sin purga la
+-- tabla crece indefinidamente. purgar_lapidas_sync() elimina las lápidas
+-- antiguas y avanza sync_horizonte: un cliente cuyo token no es posterior
+-- al horizonte pudo perder eliminaciones y debe sincronizar desde cero.
+
+-- Momento (segundos desde epoch) en que se eliminó el registro; las
+-- lápidas existentes cuentan desde esta migración
+ALTER TABLE cambios_sync ADD COLUMN fecha_eliminacion BIGINT;
+
+UPDATE cambios_sync
+SET fecha_eliminacion = EXTRACT(EPOCH FROM NOW())::BIGINT
+WHERE eliminado;
+
+CREATE INDEX idx_cambios_sync_lapidas
+    ON cambios_sync (fecha_eliminacion) WHERE eliminado;
+
+-- Una sola fila: txid de la lápida purgada más reciente
+CREATE TABLE sync_horizonte (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    txid xid8 NOT NULL
+);
+
+INSERT INTO sync_horizonte (txid) VALUES ('0');
+
+-- TG_ARGV[0]: nombre del recurso
+CREATE OR REPLACE FUNCTION fn_cambios_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO cambios_sync AS c
+            (recurso, registro_id, usuarioId, txid, eliminado, fecha_eliminacion)
+        SELECT TG_ARGV[0], id, usuarioId, pg_current_xact_id(), true,
+               EXTRACT(EPOCH FROM NOW())::BIGINT
+        FROM viejas
+        ORDER BY id
+        ON CONFLICT (recurso, registro_id) DO UPDATE SET
+            usuarioId = EXCLUDED.usuarioId,
+            txid = EXCLUDED.txid,
+            eliminado = true,
+            fecha_eliminacion = EXCLUDED.fecha_eliminacion;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO cambios_sync AS c (recurso, registro_id, usuarioId, txid, eliminado)
+        SELECT TG_ARGV[0], id, usuarioId, pg_current_xact_id(), false
+        FROM nuevas
+        ORDER BY id
+        ON CONFLICT (recurso, registro_id) DO UPDATE SET
+            usuarioId = EXCLUDED.usuarioId,
+            txid = EXCLUDED.txid,
+            eliminado = false,
+            fecha_eliminacion = NULL;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Elimina las lápidas con más de `dias` días y devuelve cuántas purgó. El
+-- horizonte se actualiza en la misma transacción que la purga.
+CREATE OR REPLACE FUNCTION purgar_lapidas_sync(dias INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+    ultimo xid8;
+BEGIN
+    WITH p AS (
+        DELETE FROM cambios_sync
+        WHERE eliminado
+          AND fecha_eliminacion < EXTRACT(EPOCH FROM NOW())::BIGINT - dias::BIGINT * 86400
+        RETURNING txid
+    )
+    SELECT COUNT(*), (array_agg(txid ORDER BY txid DESC))[1]
+    INTO filas, ultimo
+    FROM p;
+
+    IF ultimo IS NOT NULL THEN
+        UPDATE sync_horizonte SET txid = GREATEST(txid, ultimo);
+    END IF;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;